@@ -0,0 +1,63 @@
+from evtcparser import *
+import pandas as pd
+import numpy as np
+from .splits import *
+
+# Damage events are summed once per log, grouped by their keys and by which
+# phase boundaries they fall between; the per-phase tables are then small
+# re-aggregations of that, with one row per key combination instead of one
+# per event. The split functions work on these tables like on events, and
+# the aggregating methods only use the sums and counts below.
+
+DAMAGE_MEASURES = ['damage', 'count', 'is_fifty', 'is_ninety', 'is_moving', 'is_flanking', 'crit']
+
+class DamageAggregates:
+    def __init__(self, events, keys, phases):
+        self.keys = list(keys)
+        self.min_time = events['time'].min()
+        self.max_time = events['time'].max()
+
+        # phases include both their bounds, so times on a boundary get their
+        # own bucket: 2i is the gap before boundary i, 2i+1 the boundary itself
+        self.boundaries = np.unique(np.array([time for phase in phases for time in phase[1:3]], dtype=np.int64))
+        times = events['time'].values.astype(np.int64)
+        left = np.searchsorted(self.boundaries, times, side='left')
+        on_boundary = np.zeros(len(times), dtype=bool)
+        if len(self.boundaries):
+            on_boundary = self.boundaries[np.minimum(left, len(self.boundaries) - 1)] == times
+
+        frame = events[self.keys].assign(
+            bucket = 2 * left + on_boundary,
+            damage = events['damage'].values.astype(np.int64),
+            count = 1,
+            is_fifty = events['is_fifty'].values.astype(np.int64),
+            is_ninety = events['is_ninety'].values.astype(np.int64),
+            is_moving = events['is_moving'].values.astype(np.int64),
+            is_flanking = events['is_flanking'].values.astype(np.int64),
+            crit = (events['result'].values == parser.Result.CRIT).astype(np.int64))
+        self.buckets = frame.groupby(['bucket'] + self.keys, sort=False)[DAMAGE_MEASURES].sum().reset_index()
+
+    def table(self, start=None, end=None):
+        buckets = self.buckets
+        if start is not None:
+            low = 2 * np.searchsorted(self.boundaries, start) + 1
+            high = 2 * np.searchsorted(self.boundaries, end) + 1
+            buckets = buckets[(buckets.bucket >= low) & (buckets.bucket <= high)]
+        return buckets.groupby(self.keys)[DAMAGE_MEASURES].sum().reset_index()
+
+def damage_totals(table, rows=None):
+    # totals of the table, or of the rows selected by the mask rows
+    if rows is None:
+        return {measure: table[measure].values.sum() for measure in DAMAGE_MEASURES}
+    return {measure: table[measure].values[rows].sum() for measure in DAMAGE_MEASURES}
+
+def mean_of(totals, column):
+    return totals[column] / totals['count'] if totals['count'] else np.nan
+
+def split_totals_by_skill(collector, method, table):
+    # split_by_skill for tables, handing each skill's totals to method
+    sums = table.groupby('skillid')[DAMAGE_MEASURES].sum()
+    skill_name = mapped_to(ContextType.SKILL_NAME)
+    for skillid, row in zip(sums.index, sums.values):
+        collector.with_key(Group.SKILL, skill_name.apply(skillid, collector.context_values)).run(
+            method, dict(zip(DAMAGE_MEASURES, row)))
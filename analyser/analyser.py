@@ -3,9 +3,14 @@ from evtcparser import *
 import pandas as pd
 import numpy as np
 from functools import reduce
+import logging
 from .collector import *
 from .buffs import *
 from .splits import *
+from .aggregates import *
+from .profiling import StageProfiler
+from .eventindex import EventIndex
+from .intervals import *
 from .bossmetrics import *
 from .bosses import *
 
@@ -13,6 +18,8 @@ from .bosses import *
 from sys import exit
 import timeit
 
+logger = logging.getLogger(__name__)
+
 class LogType(IntEnum):
     UNKNOWN = 0
     POWER = 1
@@ -202,20 +209,27 @@ class Analyser:
         return agents, players, bosses, final_bosses
 
     def preprocess_events(self, events, bosses):
+        # built once per encounter; the rest of the analysis looks events up
+        # through it instead of scanning the whole frame per condition.
+        # Columns are grouped on first use, so the instids below are fixed
+        # before anything groups them
+        index = EventIndex(events)
+        self.event_index = index
+
         #prevent log start event shenanigans
-        events.loc[events.state_change == 9, 'ult_src_instid'] = -1
-        events.loc[events.state_change == 9, 'src_instid'] = -1
-        events.loc[events.state_change == 9, 'src_master_instid'] = -1
+        log_start = index.positions('state_change', parser.StateChange.LOG_START)
+        events.iloc[log_start, events.columns.get_loc('src_instid')] = -1
+        events.iloc[log_start, events.columns.get_loc('src_master_instid')] = -1
 
         #experimental phase calculations
         events['ult_src_instid'] = events.src_master_instid.where(
             events.src_master_instid != 0, events.src_instid)
 
-        player_src_events = events[events.ult_src_instid.isin(self.player_instids)].sort_values(by='time')
+        player_src_events = index.rows('ult_src_instid', self.player_instids).sort_values(by='time')
 
-        player_dst_events = events[events.dst_instid.isin(self.player_instids)].sort_values(by='time')
-        from_boss_events = events[events.src_instid.isin(self.boss_instids)]
-        to_boss_events = events[events.dst_instid.isin(self.boss_instids)]
+        player_dst_events = index.rows('dst_instid', self.player_instids).sort_values(by='time')
+        from_boss_events = index.rows('src_instid', self.boss_instids)
+        to_boss_events = index.rows('dst_instid', self.boss_instids)
         from_final_boss_events = from_boss_events[from_boss_events.src_instid.isin(self.final_boss_instids)]
 
         #construct frame of all health updates from the boss
@@ -237,36 +251,29 @@ class Analyser:
         phase_starts = []
         phase_ends = []
         phase_names = []
-        boss_skill_activations = from_boss_events[from_boss_events.is_activation != parser.Activation.NONE]
+        timelines = PhaseTimelines(from_boss_events, to_boss_events, health_updates, bosses)
+        self.from_boss_events = from_boss_events
+        self.to_boss_events = to_boss_events
         for phase in self.boss_info.phases:
             phase_names.append(phase.name)
             phase_starts.append(current_time)
-            self.from_boss_events = from_boss_events
-            self.to_boss_events = to_boss_events
-            phase_end = phase.find_end_time(current_time,
-                                            from_boss_events,
-                                            to_boss_events,
-                                            health_updates,
-                                            boss_skill_activations,
-                                            bosses)
+            phase_end = phase.find_end_time(current_time, timelines)
             if phase_end is None:
                 break
             phase_ends.append(phase_end)
             current_time = phase_end
         phase_ends.append( self.end_time)
 
-        def print_phase(phase):
-            print("{0}: {1} - {2} ({3})".format(phase[0],
-                                                phase[1] - self.start_time,
-                                                phase[2] - self.start_time,
-                                                phase[2] - phase[1]))
+        def relative_phase(phase):
+            return (phase[0], phase[1] - self.start_time, phase[2] - self.start_time, phase[2] - phase[1])
 
         all_phases = list(zip(phase_names, phase_starts, phase_ends))
-        print("Autodetected phases:")
-        list(map(print_phase, all_phases))
         self.phases = [a for (a,i) in zip(all_phases, self.boss_info.phases) if i.important]
-        print("Important phases:")
-        list(map(print_phase, self.phases))
+        if logger.isEnabledFor(logging.DEBUG):
+            detected = [relative_phase(phase) for phase in all_phases]
+            important = [relative_phase(phase) for phase in self.phases]
+            logger.debug("%s: autodetected phases %s, important phases %s", self.boss_info.name, detected, important,
+                         extra={'boss': self.boss_info.name, 'phases': detected, 'important_phases': important})
         
         if len(all_phases) > 1 and all_phases[0][2] - all_phases[0][1] == 0:
             raise EvtcAnalysisException("Initial phase missing or skipped")
@@ -276,9 +283,18 @@ class Analyser:
     def preprocess_skills(self, skills, collector):
         collector.set_context_value(ContextType.SKILL_NAME, create_mapping(skills, 'name'))
 
-    def __init__(self, encounter):
+    def log_time(self, time):
+        # compact encounters keep event times relative to log start
+        return None if time is None else time + self.time_offset
+
+    def __init__(self, encounter, profile=False):
         self.debug = False
         self.boss_info = BOSSES[encounter.area_id]
+        self.time_offset = encounter.time_offset
+        # per stage timings, filled in when profiling
+        self.profiler = StageProfiler(profile)
+        self.stages = self.profiler.stages
+        profiler = self.profiler
         collector = Collector.root([Group.CATEGORY,
                                     Group.PHASE,
                                     Group.PLAYER,
@@ -297,7 +313,8 @@ class Analyser:
         #print_frame(encounter.duplicate_id_agents)
 
         #set up data structures
-        events = assign_event_types(encounter.events)
+        with profiler.stage('assign_event_types'):
+            events = assign_event_types(encounter.events)
 
         gw_build_event = events[events.state_change == parser.StateChange.GW_BUILD]
         if gw_build_event.empty:
@@ -317,57 +334,78 @@ class Analyser:
 
         agents = encounter.agents
         skills = encounter.skills
-        agents, players, bosses, final_bosses = self.preprocess_agents(agents, collector, events)
-
-        self.preprocess_skills(skills, collector)
+        with profiler.stage('preprocess_agents'):
+            agents, players, bosses, final_bosses = self.preprocess_agents(agents, collector, events)
+            self.preprocess_skills(skills, collector)
         
         self.players = players
 
-        success, encounter_end = self.determine_success_reward(events, encounter)
+        with profiler.stage('determine_success_reward'):
+            success, encounter_end = self.determine_success_reward(events, encounter)
         if success:
             events = events[events['time']<encounter_end]
-        player_src_events, player_dst_events, boss_events, final_boss_events, health_updates, to_boss_events = self.preprocess_events(events, bosses)
-        player_only_events = player_src_events[player_src_events.src_instid.isin(self.player_instids)]
+        with profiler.stage('preprocess_events'):
+            player_src_events, player_dst_events, boss_events, final_boss_events, health_updates, to_boss_events = self.preprocess_events(events, bosses)
+            player_only_events = player_src_events[player_src_events.src_instid.isin(self.player_instids)]
         
         
-        self.calc_phases(events, bosses, boss_events, to_boss_events, health_updates, encounter_end)
-        if self.boss_info.kind != Kind.RAID:
-            success, encounter_end = self.determine_success(events, final_boss_events, player_src_events, encounter_end)
+        with profiler.stage('calc_phases'):
+            self.calc_phases(events, bosses, boss_events, to_boss_events, health_updates, encounter_end)
+            if self.boss_info.kind != Kind.RAID:
+                success, encounter_end = self.determine_success(events, final_boss_events, player_src_events, encounter_end)
 
-        success = success and self.validate_success(health_updates)
+            success = success and self.validate_success(health_updates)
 
         #time constraints
-        start_event = events[events.state_change == parser.StateChange.LOG_START]
+        start_event = self.event_index.rows('state_change', parser.StateChange.LOG_START)
         start_timestamp = start_event['value'].iloc[0]
         start_time = start_event['time'].iloc[0]
         
-        state_events = self.assemble_state_data(player_only_events, players, encounter_end)
+        with profiler.stage('assemble_state_data'):
+            state_events = self.assemble_state_data(self.event_index, players, encounter_end)
         self.state_events = state_events
 
-        if self.boss_info.gather_boss_specific_stats:
-            self.boss_info.gather_boss_specific_stats(events, collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "mechanics"), agents, self.subgroups, self.players, bosses, self.phases, encounter_end)
-        buff_data = BuffPreprocessor().process_events(start_time, encounter_end, skills, players, player_dst_events)
+        # buff state is built before the boss metrics, which read it too
+        with profiler.stage('process_buff_events'):
+            buff_data = BuffPreprocessor().process_events(start_time, encounter_end, skills, players, player_dst_events)
+            buff_timelines = BuffTimelines(buff_data)
         self.buff_data = buff_data
+        self.buff_timelines = buff_timelines
 
-        collector.with_key(Group.CATEGORY, "boss").run(self.collect_boss_key_events, events)
-        collector.with_key(Group.CATEGORY, "status").run(self.collect_player_status, players)
-        collector.with_key(Group.CATEGORY, "status").run(self.collect_player_key_events, player_src_events)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "damage").run(self.collect_outgoing_damage, player_src_events)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "damage").run(self.collect_incoming_damage, player_dst_events)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "shielded").run(self.collect_incoming_damage, player_dst_events[player_dst_events.is_shields != 0])
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "buffs").run(self.collect_incoming_buffs, buff_data)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "buffs").run(self.collect_outgoing_buffs, buff_data)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "events").run(self.collect_player_combat_events, player_only_events)
-        collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "events").run(self.collect_player_state_duration, state_events)
+        if self.boss_info.gather_boss_specific_stats:
+            with profiler.stage('gather_boss_specific_stats ({0})'.format(self.boss_info.name)):
+                self.boss_info.gather_boss_specific_stats(events, collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "mechanics"), agents, self.subgroups, self.players, bosses, self.phases, encounter_end, self.event_index, buff_timelines)
+
+        with profiler.stage('collect_boss_key_events'):
+            collector.with_key(Group.CATEGORY, "boss").run(self.collect_boss_key_events, events)
+        with profiler.stage('collect_player_status'):
+            collector.with_key(Group.CATEGORY, "status").run(self.collect_player_status, players)
+        with profiler.stage('collect_player_key_events'):
+            collector.with_key(Group.CATEGORY, "status").run(self.collect_player_key_events, player_src_events)
+        with profiler.stage('collect_outgoing_damage'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "damage").run(self.collect_outgoing_damage, player_src_events)
+        with profiler.stage('collect_incoming_damage'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "damage").run(self.collect_incoming_damage, player_dst_events)
+        with profiler.stage('collect_incoming_damage (shielded)'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "shielded").run(self.collect_incoming_damage, player_dst_events[player_dst_events.is_shields != 0])
+        with profiler.stage('collect_incoming_buffs'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "buffs").run(self.collect_incoming_buffs, buff_timelines.segments)
+        with profiler.stage('collect_outgoing_buffs'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "buffs").run(self.collect_outgoing_buffs, buff_timelines.segments)
+        with profiler.stage('collect_player_combat_events'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "events").run(self.collect_player_combat_events, player_only_events)
+        with profiler.stage('collect_player_state_duration'):
+            collector.with_key(Group.CATEGORY, "combat").with_key(Group.METRICS, "events").run(self.collect_player_state_duration, state_events)
 
         encounter_collector = collector.with_key(Group.CATEGORY, "encounter")
         encounter_collector.add_data('evtc_version', encounter.version)
         encounter_collector.add_data('start', start_timestamp, int)
-        encounter_collector.add_data('start_tick', start_time, int)
-        encounter_collector.add_data('end_tick', encounter_end, int)
+        encounter_collector.add_data('start_tick', self.log_time(start_time), int)
+        encounter_collector.add_data('end_tick', self.log_time(encounter_end), int)
         encounter_collector.add_data('duration', (encounter_end - start_time) / 1000, float)
         encounter_collector.add_data('success', success, bool)
-        is_cm = self.boss_info.cm_detector(events, self.boss_instids, agents)
+        with profiler.stage('cm_detector'):
+            is_cm = self.boss_info.cm_detector(events, self.boss_instids, agents)
         encounter_collector.add_data('cm', is_cm)
                 
         if not is_cm and not self.boss_info.non_cm_allowed:
@@ -376,49 +414,39 @@ class Analyser:
         encounter_collector.add_data('phase_order', [name for name,start,end in self.phases])
         for phase in self.phases:
             phase_collector = encounter_collector.with_key(Group.PHASE, phase[0])
-            phase_collector.add_data('start_tick', phase[1], int)
-            phase_collector.add_data('end_tick', phase[2], int)
+            phase_collector.add_data('start_tick', self.log_time(phase[1]), int)
+            phase_collector.add_data('end_tick', self.log_time(phase[2]), int)
             phase_collector.add_data('duration', (phase[2] - phase[1]) / 1000, float)
             
         # saved as a JSON dump
-        self.data = collector.all_data
-
-    def assemble_state_data(self, events, players, encounter_end):
-        # Get Up/Down/Death events
-        down_events = events[(events['state_change'] == parser.StateChange.CHANGE_DOWN)
-                            |(events['state_change'] == parser.StateChange.CHANGE_DEAD)
-                            |(events['state_change'] == parser.StateChange.CHANGE_UP)
-                            |(events['state_change'] == parser.StateChange.DESPAWN)
-                            |(events['state_change'] == parser.StateChange.SPAWN)
-                            ].sort_values(by='time')
+        with profiler.stage('all_data'):
+            self.data = collector.all_data
+
+    def assemble_state_data(self, index, players, encounter_end):
+        # Get Up/Down/Death events of the players themselves
+        down_events = index.select('state_change', [parser.StateChange.CHANGE_DOWN,
+                                                    parser.StateChange.CHANGE_DEAD,
+                                                    parser.StateChange.CHANGE_UP,
+                                                    parser.StateChange.DESPAWN,
+                                                    parser.StateChange.SPAWN],
+                                   lambda e: e['src_instid'].isin(players.index)
+                                             & e['ult_src_instid'].isin(players.index)
+                                   ).sort_values(by='time', kind='mergesort')
 
         # Produce down state
-        raw_data = np.array([np.arange(0, dtype=int)] * 5, dtype=int).T
-
-        for player in list(players.index):
-            data = np.array([np.arange(0)] * 4).T
-            relevent_events = down_events[down_events['src_instid'] == player]
-
-            state = parser.StateChange.CHANGE_UP
-            start_time = 0
-            for event in relevent_events.itertuples():
-
-                if state == parser.StateChange.CHANGE_DOWN:
-                    data = np.append(data, [[start_time, parser.StateChange.CHANGE_DOWN, event.time - start_time, (event.state_change == parser.StateChange.CHANGE_UP)]], axis=0)
-                elif state == parser.StateChange.CHANGE_DEAD:
-                    data = np.append(data, [[start_time, parser.StateChange.CHANGE_DEAD, event.time - start_time, 0]], axis=0)
-                elif state == parser.StateChange.DESPAWN:
-                    data = np.append(data, [[start_time, parser.StateChange.DESPAWN, event.time - start_time, 0]], axis=0)
-
-                if event.state_change != parser.StateChange.SPAWN:
-                    state = event.state_change;
-                start_time = event.time
-
-            if state != parser.StateChange.CHANGE_UP:
-                data = np.append(data, [[start_time, state, encounter_end - start_time, 1]], axis=0)
-
-            data = np.c_[[player] * data.shape[0], data]
-            raw_data = np.r_[raw_data, data]
+        # players are numbered by their position so rows come out in player order
+        segments = state_segments(players.index.get_indexer(down_events['src_instid']), down_events['time'].values,
+                                  down_events['state_change'].values, encounter_end,
+                                  parser.StateChange.CHANGE_UP, hold={parser.StateChange.SPAWN})
+        segments = segments[segments.state.isin([parser.StateChange.CHANGE_DOWN,
+                                                 parser.StateChange.CHANGE_DEAD,
+                                                 parser.StateChange.DESPAWN])]
+
+        # a down is recovered from if a rally ends it; anything still going
+        # on at the end of the encounter counts as recovered
+        recovered = (segments.next_state == -1) | ((segments.state == parser.StateChange.CHANGE_DOWN)
+                                                   & (segments.next_state == parser.StateChange.CHANGE_UP))
+        raw_data = np.c_[players.index.values[segments.owner], segments.time, segments.state, segments.duration, recovered].astype(float)
 
         return pd.DataFrame(columns = ['player', 'time', 'state', 'duration', 'recovered'], data = raw_data)
 
@@ -456,8 +484,8 @@ class Analyser:
     def collect_individual_boss_key_events(self, collector, events):
         enter_combat_time = only_entry(events[events.state_change == parser.StateChange.ENTER_COMBAT].time)
         death_time = only_entry(events[events.state_change.isin([parser.StateChange.CHANGE_DEAD, parser.StateChange.EXIT_COMBAT])].time)
-        collector.add_data("EnterCombat", enter_combat_time, int)
-        collector.add_data("Death", death_time, int)
+        collector.add_data("EnterCombat", self.log_time(enter_combat_time), int)
+        collector.add_data("Death", self.log_time(death_time), int)
 
     def collect_boss_key_events(self, collector, events):
         boss_events = events[events.ult_src_instid.isin(self.boss_instids)]
@@ -501,13 +529,14 @@ class Analyser:
         # collector.add_data('profession_name', parser.AgentType(only_entry['prof']).name, str)
         enter_combat_time = only_entry(events[events.state_change == parser.StateChange.ENTER_COMBAT].time)
         death_time = only_entry(events[events.state_change == parser.StateChange.CHANGE_DEAD].time)
-        collector.add_data("EnterCombat", enter_combat_time, int)
-        collector.add_data("Death", death_time, int)
+        collector.add_data("EnterCombat", self.log_time(enter_combat_time), int)
+        collector.add_data("Death", self.log_time(death_time), int)
 
     #section: Outgoing damage stats filtering
     def collect_outgoing_damage(self, collector, player_events):
         damage_events = filter_damage_events(player_events)
-        split_by_phase(collector, self.collect_phase_damage, damage_events, self.phases)
+        aggregates = DamageAggregates(damage_events, ['type', 'ult_src_instid', 'dst_instid', 'skillid'], self.phases)
+        split_aggregates_by_phase(collector, self.collect_phase_damage, aggregates, self.phases)
 
     def collect_phase_damage(self, collector, damage_events):
         collector.with_key(Group.DESTINATION, "*All").run(self.collect_skill_data, damage_events)
@@ -539,73 +568,80 @@ class Analyser:
         power_events = events[events.type == LogType.POWER]
         collector.set_context_value(ContextType.TOTAL_DAMAGE_FROM_SOURCE_TO_DESTINATION,
                                     events['damage'].sum())
-        split_by_skill(collector, self.aggregate_power_damage_stats, power_events)
-        split_by_skill(collector, self.aggregate_basic_damage_stats, events)
+        split_totals_by_skill(collector, self.aggregate_power_damage_stats, power_events)
+        split_totals_by_skill(collector, self.aggregate_basic_damage_stats, events)
 
     #subsection incoming damage stat filtering
     def collect_incoming_damage(self, collector, player_events):
         damage_events = filter_damage_events(player_events)
-        split_by_phase(collector, self.collect_phase_incoming_damage, damage_events, self.phases)
+        aggregates = DamageAggregates(damage_events, ['type', 'dst_instid', 'skillid'], self.phases)
+        split_aggregates_by_phase(collector, self.collect_phase_incoming_damage, aggregates, self.phases)
 
     def collect_phase_incoming_damage(self, collector, damage_events):
         collector.set_context_value(ContextType.TOTAL_DAMAGE_FROM_SOURCE_TO_DESTINATION,
                                     damage_events['damage'].sum())
         source_collector =  collector.with_key(Group.SOURCE, "*All")
-        split_by_player_groups(source_collector, self.aggregate_basic_damage_stats, damage_events, 'dst_instid', self.subgroups, self.players)
+        split_by_player_groups(source_collector, self.aggregate_incoming_damage_stats, damage_events, 'dst_instid', self.subgroups, self.players)
         split_by_player_groups(source_collector, self.collect_player_incoming_skill_damage, damage_events, 'dst_instid', self.subgroups, self.players)
 
     def collect_player_incoming_skill_damage(self, collector, events):
         collector.set_context_value(ContextType.TOTAL_DAMAGE_FROM_SOURCE_TO_DESTINATION,
                                     events['damage'].sum())
-        split_by_skill(collector, self.aggregate_basic_damage_stats, events)
+        split_totals_by_skill(collector, self.aggregate_basic_damage_stats, events)
 
     #subsection: Aggregating damage
+    # damage arrives as DamageAggregates tables, which the methods below sum
+    # into totals of its measures before reporting
     def aggregate_overall_damage_stats(self, collector, events):
-        power_events = events[events.type == LogType.POWER]
-        condi_events = events[events.type == LogType.CONDI]
-        self.aggregate_power_damage_stats(collector, power_events)
-        self.aggregate_basic_damage_stats(collector, events)
-        collector.add_data('power', power_events['damage'].sum(), int)
-        collector.add_data('condi', condi_events['damage'].sum(), int)
-        collector.add_data('power_dps', power_events['damage'].sum(), per_second(int))
-        collector.add_data('condi_dps', condi_events['damage'].sum(), per_second(int))
-
-    def aggregate_power_damage_stats(self, collector, events):
-        collector.add_data('fifty', events['is_fifty'].mean(), percentage)
-        collector.add_data('scholar', events['is_ninety'].mean(), percentage)
-        collector.add_data('seaweed', events['is_moving'].mean(), percentage)
-        collector.add_data('flanking', events['is_flanking'].mean(), percentage)
-        collector.add_data('crit', (events.result == parser.Result.CRIT).mean(), percentage)
-
-    def aggregate_basic_damage_stats(self, collector, events):
-        collector.add_data('total', events['damage'].sum(), int)
-        collector.add_data('dps', events['damage'].sum(), per_second(int))
-        collector.add_data('percentage', events['damage'].sum(),
+        types = events['type'].values
+        power = damage_totals(events, types == LogType.POWER)
+        condi = damage_totals(events, types == LogType.CONDI)
+        self.aggregate_power_damage_stats(collector, power)
+        self.aggregate_basic_damage_stats(collector, damage_totals(events))
+        collector.add_data('power', power['damage'], int)
+        collector.add_data('condi', condi['damage'], int)
+        collector.add_data('power_dps', power['damage'], per_second(int))
+        collector.add_data('condi_dps', condi['damage'], per_second(int))
+
+    def aggregate_incoming_damage_stats(self, collector, events):
+        self.aggregate_basic_damage_stats(collector, damage_totals(events))
+
+    def aggregate_power_damage_stats(self, collector, totals):
+        collector.add_data('fifty', mean_of(totals, 'is_fifty'), percentage)
+        collector.add_data('scholar', mean_of(totals, 'is_ninety'), percentage)
+        collector.add_data('seaweed', mean_of(totals, 'is_moving'), percentage)
+        collector.add_data('flanking', mean_of(totals, 'is_flanking'), percentage)
+        collector.add_data('crit', mean_of(totals, 'crit'), percentage)
+
+    def aggregate_basic_damage_stats(self, collector, totals):
+        collector.add_data('total', totals['damage'], int)
+        collector.add_data('dps', totals['damage'], per_second(int))
+        collector.add_data('percentage', totals['damage'],
                            percentage_of(ContextType.TOTAL_DAMAGE_FROM_SOURCE_TO_DESTINATION))
 
     #Section: buff stats
     
-    def collect_outgoing_buffs(self, collector, buff_data):
+    def collect_outgoing_buffs(self, collector, buff_index):
         destination_collector = collector.with_key(Group.DESTINATION, "*All");
-        phase_data = self._split_buff_by_phase(buff_data, self.start_time, self.end_time)
+        phase_data = buff_index.clip(self.start_time, self.end_time)
         destination_collector.set_context_value(ContextType.DURATION, self.end_time - self.start_time)
         destination_collector.with_key(Group.PHASE, "All").run(self.collect_buffs_by_source, phase_data)
 
         for i in range(0, len(self.phases)):
             phase = self.phases[i]
-            phase_data = self._split_buff_by_phase(buff_data, phase[1], phase[2])
+            phase_data = buff_index.clip(phase[1], phase[2])
             destination_collector.set_context_value(ContextType.DURATION, phase[2] - phase[1])
             destination_collector.with_key(Group.PHASE, "{0}".format(phase[0])).run(self.collect_buffs_by_source, phase_data)
             
-    def collect_incoming_buffs(self, collector, buff_data):
+    def collect_incoming_buffs(self, collector, buff_index):
         source_collector = collector.with_key(Group.SOURCE, "*All");
-        phase_data = self._split_buff_by_phase(buff_data, self.start_time, self.end_time)
+        phase_data = buff_index.clip(self.start_time, self.end_time)
         source_collector.set_context_value(ContextType.DURATION, self.end_time - self.start_time)
         source_collector.with_key(Group.PHASE, "All").run(self.collect_buffs_by_target, phase_data)
 
         for i in range(0, len(self.phases)):
             phase = self.phases[i]
-            phase_data = self._split_buff_by_phase(buff_data, phase[1], phase[2])
+            phase_data = buff_index.clip(phase[1], phase[2])
             source_collector.set_context_value(ContextType.DURATION, phase[2] - phase[1])
             source_collector.with_key(Group.PHASE, "{0}".format(phase[0])).run(self.collect_buffs_by_target, phase_data)
 
@@ -617,28 +653,18 @@ class Analyser:
     def collect_buffs_by_type(self, collector, buff_data):
         #collector.with_key(Group.PHASE, "All").run(self.collect_buffs_by_target, buff_data);
         if len(buff_data) > 0:
-            for buff_type in BUFF_TYPES:
+            # the buff column's codes are the types' ordinals, so one stable
+            # sort of them splits the rows by type, each still in time order
+            ordinals = buff_data['buff'].values.codes
+            order = np.argsort(ordinals, kind='mergesort')
+            types = np.arange(len(BUFF_REGISTRY.buff_types))
+            starts = np.searchsorted(ordinals[order], types, side='left')
+            ends = np.searchsorted(ordinals[order], types, side='right')
+            for buff_type, start, end in zip(BUFF_REGISTRY.buff_types, starts.tolist(), ends.tolist()):
                 collector.set_context_value(ContextType.BUFF_TYPE, buff_type)
-                buff_specific_data = buff_data[buff_data['buff'] ==  buff_type.code]
+                buff_specific_data = buff_data.iloc[order[start:end]]
                 collector.with_key(Group.BUFF, buff_type.code).run(self.collect_buff, buff_specific_data)
 
-    def _split_buff_by_phase(self, diff_data, start, end):
-        across_phase = diff_data[(diff_data['time'] < start) & (diff_data['time'] + diff_data['duration'] > end)]
-
-        #HACK: review why copy?
-        before_phase = diff_data[(diff_data['time'] < start) & (diff_data['time'] + diff_data['duration'] > start) & (diff_data['time'] + diff_data['duration'] <= end)].copy()
-        main_phase = diff_data[(diff_data['time'] >= start) & (diff_data['time'] + diff_data['duration'] <= end)]
-        after_phase = diff_data[(diff_data['time'] >= start) & (diff_data['time'] < end) & (diff_data['time'] + diff_data['duration'] > end)]
-
-        across_phase = across_phase.assign(time = start, duration = end - start, stripped = 0)
-
-        before_phase.loc[:, 'duration'] = before_phase['duration'] + before_phase['time'] - start
-        before_phase = before_phase.assign(time = start, stripped = 0)
-
-        after_phase = after_phase.assign(duration = end)
-        after_phase.loc[:, 'duration'] = after_phase['duration'] - after_phase['time']
-        return across_phase.append(before_phase).append(main_phase).append(after_phase)
-
     def collect_buff(self, collector, diff_data):
         if diff_data.empty:
             collector.add_data(None, 0.0)
@@ -662,45 +688,51 @@ class Analyser:
                              & events.value.isin(success_types)].iloc[-1]['time']
             else:
                 success = False
-        print("Success overridden by reward chest logging: {0} at time {1}".format(success, success_time))
+        logger.debug("Success overridden by reward chest logging: %s at time %s", success, success_time,
+                     extra={'decision': 'reward', 'success': success, 'time': success_time})
         return success, success_time
 
     def determine_success(self, events, final_boss_events, player_src_events, success_time):
         if(self.boss_info.despawns_instead_of_dying):
-            success, success_time = self.determine_success_despawn(events, player_src_events, success_time)
+            success, success_time = self.determine_success_despawn(self.event_index, player_src_events, success_time)
         else:
-            success, success_time = self.determine_success_death(final_boss_events, success_time)
+            success, success_time = self.determine_success_death(self.event_index, success_time)
         return success, success_time
 
-    def determine_success_death(self, final_boss_events, success_time):
+    def determine_success_death(self, index, success_time):
         success = False
-        if (not self.boss_info.despawns_instead_of_dying) and (not final_boss_events[(final_boss_events.state_change == parser.StateChange.CHANGE_DEAD)].empty):
+        final_boss_deaths = index.select('state_change', parser.StateChange.CHANGE_DEAD,
+                                         lambda e: e.src_instid.isin(self.final_boss_instids))
+        if (not self.boss_info.despawns_instead_of_dying) and (not final_boss_deaths.empty):
             success = True
-            success_time = final_boss_events[(final_boss_events.state_change == parser.StateChange.CHANGE_DEAD)].iloc[-1]['time']
-        print("Death detected: {0} at {1}".format(success, success_time))
+            success_time = final_boss_deaths.iloc[-1]['time']
+        logger.debug("Death detected: %s at %s", success, success_time,
+                     extra={'decision': 'death', 'success': success, 'time': success_time})
         return success, success_time
 
-    def determine_success_despawn(self, events, player_src_events, success_time):
+    def determine_success_despawn(self, index, player_src_events, success_time):
         success = False
         #If we completed all phases, and the key npcs survived, and at least one player survived... assume we succeeded
         if self.boss_info.despawns_instead_of_dying and len(self.phases) == len(list(filter(lambda a: a.important, self.boss_info.phases))):
             end_state_changes = [parser.StateChange.CHANGE_DEAD, parser.StateChange.DESPAWN]
             interest_state_changes = end_state_changes + [parser.StateChange.CHANGE_UP]
-            key_npc_events = events[events.src_instid.isin(self.boss_info.key_npc_ids)]
-            if key_npc_events[(key_npc_events.state_change == parser.StateChange.CHANGE_DEAD)].empty:
-                print("No key NPCs died...")
+            key_npc_deaths = index.select('state_change', parser.StateChange.CHANGE_DEAD,
+                                          lambda e: e.src_instid.isin(self.boss_info.key_npc_ids))
+            if key_npc_deaths.empty:
+                logger.debug("No key NPCs died...")
                 player_interesting_events = player_src_events[(player_src_events.src_instid.isin(self.player_instids)) &
                                                  (player_src_events.state_change.isin(interest_state_changes)) & (player_src_events.time < self.end_time)]
                 values = player_interesting_events.groupby('src_instid').last().reset_index()
                 
                 dead_players = values[values.state_change.isin(end_state_changes)].src_instid.unique()
-                print("These players died: {0}".format(dead_players))
+                logger.debug("These players died: %s", dead_players)
                 surviving_players = list(filter(lambda a: a not in dead_players, self.player_instids))
-                print("These players survived: {0}".format(surviving_players))
+                logger.debug("These players survived: %s", surviving_players)
                 if surviving_players:
                     success = True
                     success_time = self.phases[-1][2]
-            print("Probable death of despawn-only boss detected: {0} at {1}".format(success, success_time))
+            logger.debug("Probable death of despawn-only boss detected: %s at %s", success, success_time,
+                         extra={'decision': 'despawn', 'success': success, 'time': success_time})
         return success, success_time
 
     def validate_success(self, health_updates):
@@ -708,7 +740,8 @@ class Analyser:
 
     def validate_success_phases(self):
         success = len(self.phases) == len(list(filter(lambda a: a.important, self.boss_info.phases)))
-        print("Success changed due to missing important phases: {0}".format(not success))
+        logger.debug("Success changed due to missing important phases: %s", not success,
+                     extra={'decision': 'phases', 'success': success})
         return success
 
     def validate_success_health(self, health_updates):
@@ -716,7 +749,8 @@ class Analyser:
         if (self.boss_info.success_health_limit is not None and
                 health_updates[(health_updates.dst_agent <= self.boss_info.success_health_limit * 100)].empty):
                 success = False
-        print("Success changed due to health still being too high: {0}".format(not success))
+        logger.debug("Success changed due to health still being too high: %s", not success,
+                     extra={'decision': 'health', 'success': success})
         return success
     
     def validate_minimum_health(self, health_updates):
@@ -724,5 +758,6 @@ class Analyser:
         if (self.boss_info.success_min_health_limit is not None and
                 (health_updates[health_updates.dst_agent >= (self.boss_info.success_min_health_limit * 100)].empty)):
                 success = False
-        print("Success changed due to boss starting with less than minimum health: {0}".format(not success))
+        logger.debug("Success changed due to boss starting with less than minimum health: %s", not success,
+                     extra={'decision': 'minimum_health', 'success': success})
         return success
@@ -1,7 +1,11 @@
 from enum import IntEnum
+import logging
+import numpy as np
 from .bossmetrics import *
 from evtcparser.parser import StateChange
 
+logger = logging.getLogger(__name__)
+
 class DesiredValue(IntEnum):
     LOW = -1
     NONE = 0
@@ -53,12 +57,10 @@ def skorvald_cm_detector(events, boss_instids, agents = None):
     return len(events[(events.state_change == 12) & (events.dst_agent == 5551340) & (events.src_instid.isin(boss_instids))]) > 0
 
 def soulless_cm_detector(events, boss_instids, agents = None):
-    necrosis_events = events[(events.skillid == 47414)&(events.time - events.time.min() < 16000)&(events.is_buffremove == 0)].copy()
-    deltas = abs(necrosis_events.time - necrosis_events.time.shift(1))
-    deltas.fillna(10000000, inplace=True)
-    necrosis_events = necrosis_events.assign(deltas = deltas)
-    necrosis_events = necrosis_events[necrosis_events.deltas > 1000]
-    print(necrosis_events)
+    necrosis_events = events[(events.skillid == 47414)&(events.time - events.time.min() < 16000)&(events.is_buffremove == 0)]
+    # applications less than a second apart are one cast
+    necrosis_events = necrosis_events[burst_starts([], necrosis_events.time.values, 1000)]
+    logger.debug("Necrosis events:\n%s", necrosis_events)
     return len(necrosis_events) > 1
 
 class Metric:
@@ -93,6 +95,91 @@ class Boss:
         self.gather_boss_specific_stats = gather_stats
         self.enrage = enrage
 
+class BossTimeline:
+    """ Damage taken and health updates of a set of bosses, ordered by time, so
+    phase ends can be found with binary searches rather than by refiltering
+    the boss events for every phase. """
+
+    def __init__(self, from_boss_events, to_boss_events, health_updates):
+        damage = to_boss_events[(to_boss_events.type == 1) & (to_boss_events.value > 0)]
+        self.damage_times = np.sort(damage.time.values.astype(np.int64), kind='mergesort')
+        self.previous_damage_times = np.r_[np.nan, self.damage_times[:-1]]
+        self.damage_gaps = self.damage_times - self.previous_damage_times
+        self._long_gaps = {}
+
+        order = np.argsort(health_updates.time.values, kind='mergesort')
+        self.health_times = health_updates.time.values[order].astype(np.int64)
+        self.health = health_updates.dst_agent.values[order]
+
+        death_times = from_boss_events[from_boss_events.state_change == StateChange.CHANGE_DEAD].time.values
+        self.deaths = len(death_times)
+        self.last_death = int(np.max(death_times)) if self.deaths else None
+
+    def long_gaps(self, threshold):
+        # positions of the gaps in damage longer than threshold
+        if threshold not in self._long_gaps:
+            self._long_gaps[threshold] = np.flatnonzero(self.damage_gaps > threshold)
+        return self._long_gaps[threshold]
+
+    def first_gap_after(self, time, threshold):
+        # the first gap longer than threshold starting at or after time
+        gaps = self.long_gaps(threshold)
+        i = np.searchsorted(self.previous_damage_times[gaps], time, side='left')
+        return gaps[i] if i < len(gaps) else None
+
+    def first_gap_ending_after(self, time, threshold):
+        # the first gap longer than threshold ending at or after time
+        gaps = self.long_gaps(threshold)
+        i = np.searchsorted(self.damage_times[gaps], time, side='left')
+        return gaps[i] if i < len(gaps) else None
+
+    def health_window(self, start_time, end_time=None):
+        # the health updates from start_time up to (not including) end_time
+        start = np.searchsorted(self.health_times, start_time, side='left')
+        end = len(self.health_times) if end_time is None else np.searchsorted(self.health_times, end_time, side='left')
+        return slice(start, max(start, end))
+
+    def max_health(self, window):
+        health = self.health[window]
+        return health.max() if len(health) else np.nan
+
+    def min_health(self, window):
+        health = self.health[window]
+        return health.min() if len(health) else np.nan
+
+    def first_time_below(self, window, health):
+        below = np.flatnonzero(self.health[window] < health)
+        return int(self.health_times[window][below[0]]) if len(below) else None
+
+    def last_time_at_or_above(self, window, health):
+        above = np.flatnonzero(self.health[window] >= health)
+        return int(self.health_times[window][above[-1]]) if len(above) else None
+
+class PhaseTimelines:
+    """ The boss timelines phase detection asks for, built once per encounter
+    for each set of bosses a phase can end on. """
+
+    def __init__(self, from_boss_events, to_boss_events, health_updates, bosses):
+        self.from_boss_events = from_boss_events
+        self.to_boss_events = to_boss_events
+        self.health_updates = health_updates
+        self.bosses = bosses
+        self.lowest_health = health_updates['dst_agent'].min()
+        self._timelines = {}
+
+    def for_bosses(self, boss_ids):
+        key = None if boss_ids is None else tuple(boss_ids)
+        if key not in self._timelines:
+            if boss_ids is None:
+                timeline = BossTimeline(self.from_boss_events, self.to_boss_events, self.health_updates)
+            else:
+                instids = self.bosses[self.bosses.prof.isin(boss_ids)].index.values
+                timeline = BossTimeline(self.from_boss_events[self.from_boss_events.src_instid.isin(instids)],
+                                        self.to_boss_events[self.to_boss_events.dst_instid.isin(instids)],
+                                        self.health_updates[self.health_updates.src_instid.isin(instids)])
+            self._timelines[key] = timeline
+        return self._timelines[key]
+
 class Phase:
     def __init__(self, name, important,
                  phase_end_damage_stop=None,
@@ -110,86 +197,66 @@ class Phase:
         self.phase_end_boss_id = phase_end_boss_id
         self.end_on_death = end_on_death
 
-    def find_end_time(self,
-                      current_time,
-                      from_boss_events,
-                      to_boss_events,
-                      health_updates,
-                      skill_activations,
-                      bosses):
+    def find_end_time(self, current_time, timelines):
         end_time = None
-        relevant_health_updates = health_updates[(health_updates.time >= current_time)]
-        damage_gaps = to_boss_events.copy()
-        
-        if self.phase_end_boss_id is not None:
-            bosses_ids = bosses[bosses.prof.isin(self.phase_end_boss_id)].index.values
-            relevant_health_updates = relevant_health_updates[relevant_health_updates.src_instid.isin(bosses_ids)]
-            damage_gaps = damage_gaps[damage_gaps.dst_instid.isin(bosses_ids)]
-            from_boss_events = from_boss_events[from_boss_events.src_instid.isin(bosses_ids)]
-            to_boss_events = to_boss_events[to_boss_events.dst_instid.isin(bosses_ids)]
-            
-        damage_gaps = damage_gaps[(damage_gaps.type == 1) & (damage_gaps.value > 0)]
-        previous_gap_time = damage_gaps.time.shift(1)
-        gap_deltas = damage_gaps.time - previous_gap_time
-        damage_gaps = damage_gaps.assign(delta = gap_deltas, previous = previous_gap_time)    
+        timeline = timelines.for_bosses(self.phase_end_boss_id)
+        relevant_health = timeline.health_window(current_time)
                         
         if self.phase_skip_health is not None:
-            if (not relevant_health_updates.empty) and (relevant_health_updates['dst_agent'].max() < self.phase_skip_health * 100):
-                print("{0}: Detected skipped phase - past skip health threshold".format(self.name))
+            if timeline.max_health(relevant_health) < self.phase_skip_health * 100:
+                logger.debug("%s: Detected skipped phase - past skip health threshold", self.name)
                 return current_time    
             
         if self.end_on_death and self.phase_end_boss_id is not None:
-            death_events = from_boss_events[(from_boss_events.state_change == StateChange.CHANGE_DEAD)]
-            if len(death_events) == len(self.phase_end_boss_id):
-                print("{0}: Detected all current boss death".format(self.name))
-                return int(death_events['time'].iloc[-1])
+            if timeline.deaths == len(self.phase_end_boss_id):
+                logger.debug("%s: Detected all current boss death", self.name)
+                return timeline.last_death
                 
         if self.phase_end_damage_stop is not None:
-            relevant_gaps = damage_gaps[(damage_gaps.time - damage_gaps.delta >= current_time - 100) &
-                                        (damage_gaps.delta > self.phase_end_damage_stop)]
+            gap = timeline.first_gap_after(current_time - 100, self.phase_end_damage_stop)
                             
             gap_time = None
-            if relevant_gaps.empty and (len(damage_gaps.time) > 0 and int(damage_gaps.time.iloc[-1]) >= current_time):
-                gap_time = int(damage_gaps.time.iloc[-1])   
-            elif not relevant_gaps.empty:
-                gap_time = int(relevant_gaps['time'].iloc[0] - relevant_gaps['delta'].iloc[0])
+            if gap is None and (len(timeline.damage_times) > 0 and int(timeline.damage_times[-1]) >= current_time):
+                gap_time = int(timeline.damage_times[-1])
+            elif gap is not None:
+                gap_time = int(timeline.previous_damage_times[gap])
             
             if gap_time is not None:
-                relevant_health_updates = relevant_health_updates[relevant_health_updates.time < gap_time]
-                if (self.phase_skip_health is not None) and (relevant_health_updates['dst_agent'].min() < (self.phase_skip_health + 2) * 100):
-                    print("{0}: Detected skipped next phase".format(self.name))
+                relevant_health = timeline.health_window(current_time, gap_time)
+                if (self.phase_skip_health is not None) and (timeline.min_health(relevant_health) < (self.phase_skip_health + 2) * 100):
+                    logger.debug("%s: Detected skipped next phase", self.name)
                 else:
                     end_time = gap_time
-                    print("{0}: Detected gap of at least {1} at time {2}".format(self.name, self.phase_end_damage_stop, gap_time))
+                    logger.debug("%s: Detected gap of at least %s at time %s", self.name, self.phase_end_damage_stop, gap_time)
 
         elif self.phase_end_damage_start is not None:
-            relevant_gaps = damage_gaps[(damage_gaps.time >= current_time) &
-                                        (damage_gaps.delta > self.phase_end_damage_start)]
-            if not relevant_gaps.empty:
-                end_time = int(relevant_gaps['time'].iloc[0])
-                relevant_health_updates = relevant_health_updates[relevant_health_updates.time < end_time]
-                if (self.phase_skip_health is not None) and (relevant_health_updates['dst_agent'].min() < (self.phase_skip_health + 2) * 100):
-                    print("{0}: Damage passed skip point, skipping".format(self.name))
+            gap = timeline.first_gap_ending_after(current_time, self.phase_end_damage_start)
+            if gap is not None:
+                end_time = int(timeline.damage_times[gap])
+                relevant_health = timeline.health_window(current_time, end_time)
+                if (self.phase_skip_health is not None) and (timeline.min_health(relevant_health) < (self.phase_skip_health + 2) * 100):
+                    logger.debug("%s: Damage passed skip point, skipping", self.name)
                     return current_time
-                print("{0}: Detected gap of at least {1} ending at time {2}".format(self.name, self.phase_end_damage_start, end_time))        
+                logger.debug("%s: Detected gap of at least %s ending at time %s", self.name, self.phase_end_damage_start, end_time)        
                 
         if self.phase_end_health is not None:
-            if (not relevant_health_updates.empty) and (relevant_health_updates['dst_agent'].max() < self.phase_end_health * 100):
-                print("{0}: Detected skipped phase - past phase end health".format(self.name))
+            if timeline.max_health(relevant_health) < self.phase_end_health * 100:
+                logger.debug("%s: Detected skipped phase - past phase end health", self.name)
                 return current_time
             
             #Find health updates below threshold first
-            below_health_updates = relevant_health_updates[(relevant_health_updates.dst_agent < self.phase_end_health * 100)]
-            if not below_health_updates.empty:
-                end_time = current_time = int(below_health_updates['time'].iloc[0])
-                print("{0}: Detected health threshold reached at {1}".format(self.name, current_time))
+            below_time = timeline.first_time_below(relevant_health, self.phase_end_health * 100)
+            if below_time is not None:
+                end_time = current_time = below_time
+                logger.debug("%s: Detected health threshold reached at %s", self.name, current_time)
             else:
-                relevant_health_updates = relevant_health_updates[(relevant_health_updates.dst_agent >= self.phase_end_health * 100)]
-                if relevant_health_updates.empty or health_updates['dst_agent'].min() > (self.phase_end_health + 2) * 100:
-                    print("No relevant events above {0} and above {1} health".format(current_time, self.phase_end_health * 100))
+                above_time = timeline.last_time_at_or_above(relevant_health, self.phase_end_health * 100)
+                if above_time is None or timelines.lowest_health > (self.phase_end_health + 2) * 100:
+                    logger.debug("No relevant events above %s and above %s health", current_time, self.phase_end_health * 100)
                     return None
-                end_time = current_time = int(relevant_health_updates['time'].iloc[-1])
-            print("{0}: Detected health below {1} at time {2} - prior health: {3}".format(self.name, self.phase_end_health, current_time, relevant_health_updates['dst_agent'].max()))
+                end_time = current_time = above_time
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s: Detected health below %s at time %s - prior health: %s", self.name, self.phase_end_health, current_time, timeline.max_health(relevant_health))
             
         
         return end_time
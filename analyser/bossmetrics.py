@@ -3,8 +3,12 @@ from evtcparser import *
 import pandas as pd
 import numpy as np
 from functools import reduce
+import logging
 from .collector import *
 from .splits import *
+from .intervals import *
+
+logger = logging.getLogger(__name__)
 
 class Skills:
     BLUE_PYLON_POWER = 31413
@@ -120,40 +124,19 @@ class Skills:
 def standard_count(events):
     return len(events);
     
-def combine_by_time_range_and_instid(events, time_range, inst_id = 'dst_instid'):
-    events = events.sort_values(by=[inst_id, 'time'])
-    deltas = abs(events.time - events.time.shift(1)) + (abs(events[inst_id] - events[inst_id].shift(1)) * 10000000)
-    deltas.fillna(10000000, inplace=True)
-    events = events.assign(deltas = deltas)
-    events = events[events.deltas > time_range]
-    return events
-
-def generate_player_buff_times(events, players, skillid, encounter_end):
-    events = events[(events.skillid == skillid) & (events.buff == 1)].sort_values(by='time')
-
-    raw_data = np.array([np.arange(0, dtype=int)] * 3, dtype=int).T
-    for player in list(players.index):
-        data = np.array([np.arange(0)] * 2).T
-        player_events = events[((events['dst_instid'] == player)&(events.is_buffremove == 0))|
-                               ((events['src_instid'] == player)&(events.is_buffremove == 1))]
-
-        active = False
-        start_time = 0
-        for event in player_events.itertuples():
-            if event.is_buffremove == 0 and active == False:
-                active = True
-                start_time = event.time
-            elif event.is_buffremove == 1 and active == True:
-                active = False
-                data = np.append(data, [[start_time, event.time - start_time]], axis=0)
-
-        if active == True:
-            data = np.append(data, [[start_time, encounter_end - start_time]], axis=0)
-
-        data = np.c_[[player] * data.shape[0], data]
-        raw_data = np.r_[raw_data, data]
-
-    return pd.DataFrame(columns = ['player', 'time', 'duration'], data = raw_data)
+def player_buff_events(index, players, skillid):
+    # the events of a boss buff that change a player's stacks: applications
+    # count for their target, removals for the player losing the buff
+    events = index.select('skillid', skillid, lambda e: e.buff == 1).sort_values(by='time')
+    owners = np.where(events.is_buffremove == 0, events.dst_instid,
+                      np.where(events.is_buffremove == 1, events.src_instid, -1))
+    owned = np.isin(owners, players.index)
+    return owners[owned], events.time.values[owned], events.is_buffremove.values[owned] == 0
+
+def add_player_buff_times(index, buffs, players, skillid, encounter_end):
+    # a boss buff held from an application until the next removal
+    owners, times, applied = player_buff_events(index, players, skillid)
+    buffs.add_toggled(skillid, owners, times, applied, encounter_end)
 
 def gather_count_stat(name, collector, by_player, by_phase, phases, subgroups, players, events, calculation = standard_count):
     def count_by_phase(collector, events, func):
@@ -175,188 +158,246 @@ def gather_count_stat(name, collector, by_player, by_phase, phases, subgroups, p
         collector = collector.with_key(Group.PHASE, "All").with_key(Group.SUBGROUP, "*All")
         count(collector, events)
 
-def gather_trio_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
+# Conditions on the events of a mechanic's skills: each takes the events,
+# players and bosses, and returns a mask over the events.
+
+def hits_player(events, players, bosses):
+    return events.dst_instid.isin(players.index) & (events.value > 0)
+
+def reaches_player(events, players, bosses):
+    return events.dst_instid.isin(players.index)
+
+def applied_to_player(events, players, bosses):
+    return events.dst_instid.isin(players.index) & (events.is_buffremove == 0)
+
+def buff_applied_to_player(events, players, bosses):
+    return events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)
+
+def buff_removed_from_player(events, players, bosses):
+    return events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 1)
+
+def buff_applied(events, players, bosses):
+    return (events.buff == 1) & (events.is_buffremove == 0)
+
+def not_removed(events, players, bosses):
+    return events.is_buffremove == 0
+
+def removed(events, players, bosses):
+    return events.is_buffremove == 1
+
+class Mechanic:
+    """ A boss mechanic counted from the events of one or more skills. """
+
+    def __init__(self, name, skillids, condition=None, by_player=True, by_phase=False,
+                 dedupe_window=None, dedupe_by='dst_instid', calculation=standard_count):
+        self.name = name
+        self.skillids = frozenset([skillids] if np.isscalar(skillids) else skillids)
+        self.condition = condition
+        self.by_player = by_player
+        self.by_phase = by_phase
+        self.dedupe_window = dedupe_window
+        self.dedupe_by = dedupe_by
+        self.calculation = calculation
+
+def gather_mechanics(mechanics, collector, subgroups, players, bosses, phases, index):
+    # one scan picks out the events of every skill the mechanics count; each
+    # condition is then evaluated once over those, however many mechanics share it
+    skillids = set().union(*(mechanic.skillids for mechanic in mechanics))
+    events = index.rows('skillid', skillids)
+    event_skillids = events.skillid.values
+
+    masks = {}
+    for mechanic in mechanics:
+        if mechanic.condition is not None and mechanic.condition not in masks:
+            masks[mechanic.condition] = np.asarray(mechanic.condition(events, players, bosses), dtype=bool)
+
+    selections = []
+    for mechanic in mechanics:
+        selected = np.isin(event_skillids, list(mechanic.skillids))
+        if mechanic.condition is not None:
+            selected &= masks[mechanic.condition]
+        selections.append(np.flatnonzero(selected))
+
+    # repeated hits are deduped for all mechanics together, grouped by the
+    # mechanic and the agent they are deduped by
+    deduped = [i for i, mechanic in enumerate(mechanics) if mechanic.dedupe_window is not None]
+    if deduped:
+        positions = np.concatenate([selections[i] for i in deduped])
+        numbers = np.concatenate([np.full(len(selections[i]), i) for i in deduped])
+        instids = np.concatenate([events[mechanics[i].dedupe_by].values[selections[i]] for i in deduped])
+        windows = np.concatenate([np.full(len(selections[i]), mechanics[i].dedupe_window) for i in deduped])
+        kept = burst_starts([numbers, instids], events.time.values[positions], windows)
+        for i in deduped:
+            selections[i] = positions[kept & (numbers == i)]
+
+    for mechanic, selection in zip(mechanics, selections):
+        gather_count_stat(mechanic.name, collector, mechanic.by_player, mechanic.by_phase, phases, subgroups, players,
+                          events.iloc[selection], mechanic.calculation)
+
+def gather_trio_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
     return
 
-def gather_sh_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    vortex_inner_events = events[(events.skillid == Skills.VORTEX_SLASH_INNER) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    vortex_outer_events = events[(events.skillid == Skills.VORTEX_SLASH_OUTER) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    death_aoe_events = events[(events.skillid == Skills.DEATH_AOE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    pie_slice_events = events[(events.skillid.isin(Skills.PIE_SLICE)) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    sythe_events = events[(events.skillid == Skills.SCYTHE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    necrosis_events = events[(events.skillid == Skills.NECROSIS) & events.dst_instid.isin(players.index) & (events.is_buffremove == 0)]
-    
-    gather_count_stat('Inner Vortex', collector, True, False, phases, subgroups, players, vortex_inner_events)
-    gather_count_stat('Outer Vortex', collector, True, False, phases, subgroups, players, vortex_outer_events)
-    gather_count_stat('Soul Rift', collector, True, False, phases, subgroups, players, death_aoe_events)
-    gather_count_stat('Quad Slash', collector, True, False, phases, subgroups, players, pie_slice_events)
-    gather_count_stat('Scythe Hits', collector, True, False, phases, subgroups, players, sythe_events)
-    gather_count_stat('Necrosis Received', collector, True, False, phases, subgroups, players, necrosis_events)
-
-def gather_dhuum_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    messenger_events = events[(events.skillid == Skills.MESSENGER) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    shackle_events = events[(events.skillid == Skills.SHACKLE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    crack_events = events[(events.skillid == Skills.CRACK) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    putrid_bomb_events = events[(events.skillid == Skills.PUTRID_BOMB) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    suck_events = events[(events.skillid == Skills.SUCK) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    death_mark_events = events[(events.skillid == Skills.DEATH_MARK) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    snatch_events = combine_by_time_range_and_instid(events[(events.skillid == Skills.SNATCH) & events.dst_instid.isin(players.index) & (events.value > 0)], 1000)
-    gaze_events = events[(events.skillid == Skills.GAZE) & events.dst_instid.isin(players.index) & (events.is_buffremove == 0)]
-    
-    gather_count_stat('Messenger', collector, True, False, phases, subgroups, players, messenger_events)
-    gather_count_stat('Shackle Hits', collector, True, False, phases, subgroups, players, shackle_events)
-    gather_count_stat('Fissured', collector, True, False, phases, subgroups, players, crack_events)
-    gather_count_stat('Putrid Bomb', collector, True, False, phases, subgroups, players, putrid_bomb_events)
-    gather_count_stat('Sucked', collector, True, False, phases, subgroups, players, suck_events)
-    gather_count_stat('Death Marked', collector, True, False, phases, subgroups, players, death_mark_events)
-    gather_count_stat('Snatched', collector, True, False, phases, subgroups, players, snatch_events)
-    gather_count_stat('Dhuum Gaze', collector, True, False, phases, subgroups, players, gaze_events)
+SH_MECHANICS = [
+    Mechanic('Inner Vortex', Skills.VORTEX_SLASH_INNER, hits_player),
+    Mechanic('Outer Vortex', Skills.VORTEX_SLASH_OUTER, hits_player),
+    Mechanic('Soul Rift', Skills.DEATH_AOE, hits_player),
+    Mechanic('Quad Slash', Skills.PIE_SLICE, hits_player),
+    Mechanic('Scythe Hits', Skills.SCYTHE, hits_player),
+    Mechanic('Necrosis Received', Skills.NECROSIS, applied_to_player)
+]
+
+def gather_sh_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(SH_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+DHUUM_MECHANICS = [
+    Mechanic('Messenger', Skills.MESSENGER, hits_player),
+    Mechanic('Shackle Hits', Skills.SHACKLE, hits_player),
+    Mechanic('Fissured', Skills.CRACK, hits_player),
+    Mechanic('Putrid Bomb', Skills.PUTRID_BOMB, hits_player),
+    Mechanic('Sucked', Skills.SUCK, hits_player),
+    Mechanic('Death Marked', Skills.DEATH_MARK, hits_player),
+    Mechanic('Snatched', Skills.SNATCH, hits_player, dedupe_window=1000),
+    Mechanic('Dhuum Gaze', Skills.GAZE, applied_to_player)
+]
+
+def gather_dhuum_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(DHUUM_MECHANICS, collector, subgroups, players, bosses, phases, index)
         
-def gather_vg_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    teleport_events = events[(events.skillid == Skills.UNSTABLE_MAGIC_SPIKE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    teleport_events = combine_by_time_range_and_instid(teleport_events, 1000)
-    bullet_storm_events = events[(events.skillid == Skills.BULLET_STORM) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    gather_count_stat('Teleports', collector, True, False, phases, subgroups, players, teleport_events)
-    gather_count_stat('Bullets Eaten', collector, True, False, phases, subgroups, players, bullet_storm_events)
-    vg_blue_guardian_invul(events, collector)
-
-def vg_blue_guardian_invul(events, collector):
-    relevent_events = events[(events.skillid == Skills.BLUE_PYLON_POWER) & ((events.is_buffremove == 1) | (events.is_buffremove == 0))]
-    time = 0
-    start_time = 0
-    buff_up = False
-    for event in relevent_events.itertuples():
-        if buff_up == False & (event.is_buffremove == 0):
-            buff_up = True
-            start_time = event.time
-        elif buff_up == True & (event.is_buffremove == 1):
-            buff_up = False
-            time += event.time - start_time
+VG_MECHANICS = [
+    Mechanic('Teleports', Skills.UNSTABLE_MAGIC_SPIKE, hits_player, dedupe_window=1000),
+    Mechanic('Bullets Eaten', Skills.BULLET_STORM, hits_player)
+]
+
+def gather_vg_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(VG_MECHANICS, collector, subgroups, players, bosses, phases, index)
+    vg_blue_guardian_invul(index, collector)
+
+def vg_blue_guardian_invul(index, collector):
+    relevent_events = index.select('skillid', Skills.BLUE_PYLON_POWER, lambda e: ((e.is_buffremove == 1) | (e.is_buffremove == 0)))
+    invulnerable = on_intervals(np.zeros(len(relevent_events), dtype=int), relevent_events.time.values,
+                                relevent_events.is_buffremove.values == 0)
+    time = invulnerable['duration'].sum()
 
     collector.with_key(Group.PHASE, "All").with_key(Group.SUBGROUP, "*All").add_data('Blue Guardian Invulnerability Time', time, int)
 
     
-def gather_gorse_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    spectral_impact_events = events[(events.skillid == Skills.SPECTRAL_IMPACT) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    imprisonment_events = events[(events.skillid == Skills.GHASTLY_PRISON) & events.dst_instid.isin(players.index) & (events.is_buffremove == 0)]
-    imprisonment_events = combine_by_time_range_and_instid(imprisonment_events, 1000)
-    gather_count_stat('Unmitigated Spectral Impacts', collector, True, True, phases, subgroups, players, spectral_impact_events)
-    gather_count_stat('Ghastly Imprisonments', collector, True, False, phases, subgroups, players, imprisonment_events)
-    gorse_spectral_darkness_time('Spectral Darkness', collector, events, encounter_end, players, subgroups)
-
-def gorse_spectral_darkness_time(name, collector, events, encounter_end, players, subgroups):
-    times = generate_player_buff_times(events, players, Skills.SPECTRAL_DARKNESS, encounter_end)
+GORSE_MECHANICS = [
+    Mechanic('Unmitigated Spectral Impacts', Skills.SPECTRAL_IMPACT, hits_player, by_phase=True),
+    Mechanic('Ghastly Imprisonments', Skills.GHASTLY_PRISON, applied_to_player, dedupe_window=1000)
+]
+
+def gather_gorse_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(GORSE_MECHANICS, collector, subgroups, players, bosses, phases, index)
+    gorse_spectral_darkness_time('Spectral Darkness', collector, index, buffs, encounter_end, players, subgroups)
+
+def gorse_spectral_darkness_time(name, collector, index, buffs, encounter_end, players, subgroups):
+    add_player_buff_times(index, buffs, players, Skills.SPECTRAL_DARKNESS, encounter_end)
+    times = pd.DataFrame({'player': players.index.values,
+                          'duration': [buffs.uptime(player, Skills.SPECTRAL_DARKNESS) for player in players.index]},
+                         columns = ['player', 'duration'])
     collector = collector.with_key(Group.PHASE, "All")
     def count(collector, times):
         collector.add_data(name, times['duration'].sum(), int)
     split_by_player_groups(collector, count, times, 'player', subgroups, players)
 
     
-def gather_sab_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    bomb_explosion_events = events[(events.skillid == Skills.HEAVY_BOMB_EXPLODE) & (events.is_buffremove == 1)]
-    gather_count_stat('Heavy Bombs Undefused', collector, False, False, phases, subgroups, players, bomb_explosion_events)
+SAB_MECHANICS = [
+    Mechanic('Heavy Bombs Undefused', Skills.HEAVY_BOMB_EXPLODE, removed, by_player=False)
+]
+
+def gather_sab_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(SAB_MECHANICS, collector, subgroups, players, bosses, phases, index)
 
     
-def gather_sloth_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    tantrum_hits = events[(events.skillid == Skills.TANTRUM) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    spores_received = events[(events.skillid == Skills.BLEEDING) & events.dst_instid.isin(players.index) & (events.value > 0) & (events.is_buffremove == 0)]
-    spores_blocked = events[(events.skillid == Skills.BLEEDING) & events.dst_instid.isin(players.index) & (events.value == 0) & (events.is_buffremove == 0)]
-    volatile_poison = events[(events.skillid == Skills.VOLATILE_POISON) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    toxic_cloud = events[(events.skillid == Skills.TOXIC_CLOUD) & events.dst_instid.isin(players.index) & (events.value == 0)]                                                                                                                                          
-    gather_count_stat('Tantrum Knockdowns', collector, True, False, phases, subgroups, players, tantrum_hits)
-    gather_count_stat('Spores Received', collector, True, False, phases, subgroups, players, spores_received, lambda e: len(e) / 5)
-    gather_count_stat('Spores Blocked', collector, True, False, phases, subgroups, players, spores_blocked, lambda e: len(e) / 5)
-    gather_count_stat('Volatile Poison Carrier', collector, True, False, phases, subgroups, players, volatile_poison)
-    gather_count_stat('Toxic Cloud Breathed', collector, True, False, phases, subgroups, players, toxic_cloud)                             
+SLOTH_MECHANICS = [
+    Mechanic('Tantrum Knockdowns', Skills.TANTRUM, hits_player),
+    Mechanic('Spores Received', Skills.BLEEDING,
+             lambda e, players, bosses: hits_player(e, players, bosses) & (e.is_buffremove == 0),
+             calculation=lambda e: len(e) / 5),
+    Mechanic('Spores Blocked', Skills.BLEEDING,
+             lambda e, players, bosses: e.dst_instid.isin(players.index) & (e.value == 0) & (e.is_buffremove == 0),
+             calculation=lambda e: len(e) / 5),
+    Mechanic('Volatile Poison Carrier', Skills.VOLATILE_POISON, buff_applied_to_player),
+    Mechanic('Toxic Cloud Breathed', Skills.TOXIC_CLOUD,
+             lambda e, players, bosses: e.dst_instid.isin(players.index) & (e.value == 0))
+]
+
+def gather_sloth_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(SLOTH_MECHANICS, collector, subgroups, players, bosses, phases, index)
 
     
-def gather_matt_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    unbalanced_events = events[(events.skillid == Skills.UNBALANCED) & events.dst_instid.isin(players.index) & (events.buff == 0)]
-    surrender_events = events[(events.skillid == Skills.SURRENDER) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    burning_events = events[(events.skillid == Skills.BURNING) & events.dst_instid.isin(players.index) & events.src_instid.isin(bosses.index) & (events.value > 0) & (events.buff == 1) & (events.is_buffremove == 0)]
-    corrupted_events = events[(events.skillid == Skills.CORRUPTION) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    blood_fueled_events = events[(events.skillid == Skills.BLOOD_FUELED) & (events.buff == 1) & (events.is_buffremove == 0)]
-    sacrifice_events = events[(events.skillid == Skills.SACRIFICE) & (events.buff == 1) & (events.is_buffremove == 0)]
-    profane_events = events[(events.skillid == Skills.UNSTABLE_BLOOD_MAGIC) & (events.buff == 1) & (events.is_buffremove == 0)]
-
-    gather_count_stat('Moved While Unbalanced', collector, True, False, phases, subgroups, players, unbalanced_events)
-    gather_count_stat('Surrender', collector, True, False, phases, subgroups, players, surrender_events)
-    gather_count_stat('Burning Stacks Received', collector, True, True, phases, subgroups, players, burning_events)
-    gather_count_stat('Corrupted', collector, True, False, phases, subgroups, players, corrupted_events)
-    gather_count_stat('Matthias Shards Returned', collector, False, False, phases, subgroups, players,
-                           blood_fueled_events[blood_fueled_events.dst_instid.isin(bosses.index)])
-    gather_count_stat('Shards Absorbed', collector, True, False, phases, subgroups, players,
-                           blood_fueled_events[blood_fueled_events.dst_instid.isin(players.index)])
-    gather_count_stat('Sacrificed', collector, True, False, phases, subgroups, players, sacrifice_events)
-    gather_count_stat('Well of the Profane Carrier', collector, True, False, phases, subgroups, players, profane_events)
+MATT_MECHANICS = [
+    Mechanic('Moved While Unbalanced', Skills.UNBALANCED,
+             lambda e, players, bosses: e.dst_instid.isin(players.index) & (e.buff == 0)),
+    Mechanic('Surrender', Skills.SURRENDER, hits_player),
+    Mechanic('Burning Stacks Received', Skills.BURNING,
+             lambda e, players, bosses: hits_player(e, players, bosses) & e.src_instid.isin(bosses.index) & buff_applied(e, players, bosses),
+             by_phase=True),
+    Mechanic('Corrupted', Skills.CORRUPTION, buff_applied_to_player),
+    Mechanic('Matthias Shards Returned', Skills.BLOOD_FUELED,
+             lambda e, players, bosses: buff_applied(e, players, bosses) & e.dst_instid.isin(bosses.index),
+             by_player=False),
+    Mechanic('Shards Absorbed', Skills.BLOOD_FUELED, buff_applied_to_player),
+    Mechanic('Sacrificed', Skills.SACRIFICE, buff_applied),
+    Mechanic('Well of the Profane Carrier', Skills.UNSTABLE_BLOOD_MAGIC, buff_applied)
+]
+
+def gather_matt_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(MATT_MECHANICS, collector, subgroups, players, bosses, phases, index)
 
     
-def gather_kc_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    orb_events = events[events.dst_instid.isin(players.index) & events.skillid.isin({Skills.RED_ORB_ATTUNEMENT, Skills.WHITE_ORB_ATTUNEMENT, Skills.RED_ORB, Skills.WHITE_ORB}) & (events.is_buffremove == 0)]
+KC_MECHANICS = [
+    Mechanic('Rifts Hit', Skills.COMPROMISED, not_removed, by_player=False),
+    Mechanic('Gaining Power', Skills.GAINING_POWER, not_removed, by_player=False),
+    Mechanic('Magic Blast Intensity', Skills.MAGIC_BLAST_INTENSITY, not_removed, by_player=False)
+]
 
-    orb_catch_events = generate_kc_orb_catch_events(players, orb_events)
+def gather_kc_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    orb_events = index.select('skillid', {Skills.RED_ORB_ATTUNEMENT, Skills.WHITE_ORB_ATTUNEMENT, Skills.RED_ORB, Skills.WHITE_ORB},
+                              lambda e: e.dst_instid.isin(players.index) & (e.is_buffremove == 0))
 
-    compromised_events = events[(events.skillid == Skills.COMPROMISED) & (events.is_buffremove == 0)]
-    gaining_power_events = events[(events.skillid == Skills.GAINING_POWER) & (events.is_buffremove == 0)]
-    magic_blast_intensity_events = events[(events.skillid == Skills.MAGIC_BLAST_INTENSITY) & (events.is_buffremove == 0)]
+    orb_catch_events = generate_kc_orb_catch_events(players, orb_events)
 
     gather_count_stat('Correct Orb', collector, True, False, phases, subgroups, players, orb_catch_events[orb_catch_events.correct == 1])
     gather_count_stat('Wrong Orb', collector, True, False, phases, subgroups, players, orb_catch_events[orb_catch_events.correct == 0])
-    gather_count_stat('Rifts Hit', collector, False, False, phases, subgroups, players, compromised_events)
-    gather_count_stat('Gaining Power', collector, False, False, phases, subgroups, players, gaining_power_events)
-    gather_count_stat('Magic Blast Intensity', collector, False, False, phases, subgroups, players, magic_blast_intensity_events)
-
-def generate_kc_orb_catch_events(players, events):               
-    raw_data = np.array([np.arange(0, dtype=int)] * 3, dtype=int).T
-    for player in list(players.index):
-        data = np.array([np.arange(0)] * 2).T
-        player_events = events[(events['dst_instid'] == player)]
-
-        red_attuned = False
-        for event in player_events.itertuples():
-            if event.skillid == Skills.RED_ORB_ATTUNEMENT:
-                red_attuned = True
-            elif event.skillid == Skills.WHITE_ORB_ATTUNEMENT:
-                red_attuned = False
-            elif event.skillid == Skills.RED_ORB:
-                data = np.append(data, [[event.time, red_attuned]], axis=0)
-            elif event.skillid == Skills.WHITE_ORB:
-                data = np.append(data, [[event.time, not red_attuned]], axis=0)
-
-        data = np.c_[[player] * data.shape[0], data]
-        raw_data = np.r_[raw_data, data]
-
-    return pd.DataFrame(columns = ['dst_instid', 'time', 'correct'], data = raw_data)
-
-
-def gather_xera_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    derangement_events = events[(events.skillid == Skills.DERANGEMENT) & (events.buff == 1) & ((events.dst_instid.isin(players.index) & (events.is_buffremove == 0))|(events.src_instid.isin(players.index) & (events.is_buffremove == 1)))]
-    gather_count_stat('Derangement', collector, True, False, phases, subgroups, players, derangement_events[derangement_events.is_buffremove == 0])
-    #xera_derangement_max_stacks('Peak Derangement', collector, derangement_events, events.time.min(), players, subgroups)
-
-def xera_derangement_max_stacks(name, collector, events, start_time, players, subgroups):
-    events = events.sort_values(by='time')
-
-    raw_data = np.array([np.arange(0, dtype=int)] * 2, dtype=int).T
-    for player in list(players.index):
-        player_events = events[((events['dst_instid'] == player)&(events.is_buffremove == 0))|
-                               ((events['src_instid'] == player)&(events.is_buffremove == 1))]
-
-        max_stacks = 0
-        stacks = 0
-        for event in player_events.itertuples():
-            if event.is_buffremove == 0:
-                stacks = stacks + 1
-            elif event.is_buffremove == 1:
-                print(str(event.time - start_time) + " - " + str(stacks))
-                if stacks > max_stacks:
-                    max_stacks = stacks
-                stacks = max(stacks - 8, 0)
-
-        print(stacks)
-        if stacks > max_stacks:
-            max_stacks = stacks
-        raw_data = np.append(raw_data, [[player, max_stacks]], axis=0)
+    gather_mechanics(KC_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+def generate_kc_orb_catch_events(players, events):
+    events = events[events['dst_instid'].isin(players.index)]
+
+    # the attunement each player holds when an orb reaches them
+    attunement = carried_states(events.dst_instid.values, events.skillid.values, Skills.WHITE_ORB_ATTUNEMENT,
+                                hold={Skills.RED_ORB, Skills.WHITE_ORB})
+    red_attuned = attunement == Skills.RED_ORB_ATTUNEMENT
+    red_orb = events.skillid.values == Skills.RED_ORB
+    white_orb = events.skillid.values == Skills.WHITE_ORB
+    catches = red_orb | white_orb
+
+    data = pd.DataFrame({'dst_instid': events.dst_instid.values[catches],
+                         'time': events.time.values[catches],
+                         'correct': (red_attuned == red_orb)[catches].astype(int)},
+                        columns = ['dst_instid', 'time', 'correct'])
+    return data.sort_values(by='dst_instid', kind='mergesort')
+
+XERA_MECHANICS = [
+    Mechanic('Derangement', Skills.DERANGEMENT, buff_applied_to_player)
+]
+
+def gather_xera_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(XERA_MECHANICS, collector, subgroups, players, bosses, phases, index)
+    #xera_derangement_max_stacks('Peak Derangement', collector, index, buffs, players, subgroups)
+
+def xera_derangement_max_stacks(name, collector, index, buffs, players, subgroups):
+    owners, times, applied = player_buff_events(index, players, Skills.DERANGEMENT)
+
+    # every stack gained adds one, every removal takes eight off the stacks held
+    buffs.add_stacked(Skills.DERANGEMENT, owners, times, np.where(applied, 1, -8))
+    max_stacks = pd.Series([buffs.max_stacks(player, Skills.DERANGEMENT) for player in players.index],
+                           index=players.index)
+    if logger.isEnabledFor(logging.DEBUG):
+        for player, stacks in max_stacks.items():
+            logger.debug("%s - %s", player, stacks)
+    raw_data = np.c_[max_stacks.index, max_stacks.values]
 
     data = pd.DataFrame(columns = ['player', 'max_stacks'], data = raw_data)
 
@@ -365,128 +406,92 @@ def xera_derangement_max_stacks(name, collector, events, start_time, players, su
         collector.add_data(name, data['max_stacks'].max(), int)
     split_by_player_groups(collector, max_stacks, data, 'player', subgroups, players)
 
-def gather_cairn_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    displacement_events = events[(events.skillid == Skills.DISPLACEMENT) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    meteor_swarm_events = events[(events.skillid == Skills.METEOR_SWARM) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    meteor_swarm_events = combine_by_time_range_and_instid(meteor_swarm_events, 1000, 'dst_instid')
-
-    spatial_manipulation_events = events[(events.skillid.isin(Skills.SPATIAL_MANIPULATION)) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    shared_agony_events = events[(events.skillid == Skills.SHARED_AGONY) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)] 
-    gather_count_stat('Displacement', collector, True, False, phases, subgroups, players, displacement_events)
-    gather_count_stat('Meteor Swarm', collector, True, False, phases, subgroups, players, meteor_swarm_events)
-    gather_count_stat('Spatial Manipulation', collector, True, False, phases, subgroups, players, spatial_manipulation_events)
-    gather_count_stat('Shared Agony', collector, True, False, phases, subgroups, players, shared_agony_events)
-
-
-def gather_mursaat_overseer_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    protect_events = events[(events.skillid == Skills.PROTECT) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 1)]
-    claim_events = events[(events.skillid == Skills.CLAIM) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 1)]
-    dispel_events = events[(events.skillid == Skills.DISPEL) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 1)]
-    soldiers_aura_events = events[(events.skillid == Skills.SOLDIERS_AURA) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    soldiers = events[(events.skillid == Skills.SOLDIERS_AURA)].groupby('src_instid').first()
-    enemy_tile_events = events[(events.skillid == Skills.ENEMY_TILE) & events.dst_instid.isin(players.index)]
-
-    gather_count_stat('Protect', collector, True, False, phases, subgroups, players, protect_events)
-    gather_count_stat('Claim', collector, True, False, phases, subgroups, players, claim_events)
-    gather_count_stat('Dispel', collector, True, False, phases, subgroups, players, dispel_events)
-    gather_count_stat('Soldiers', collector, False, False, phases, subgroups, players, soldiers)
-    gather_count_stat('Soldier\'s Aura', collector, True, False, phases, subgroups, players, soldiers_aura_events)
-    gather_count_stat('Enemy Tile', collector, True, False, phases, subgroups, players, enemy_tile_events)
-
-def gather_samarog_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    claw_events = events[(events.skillid == Skills.SAMAROG_CLAW) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    shockwave_events = events[(events.skillid == Skills.SHOCKWAVE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    sweep_events = events[(events.skillid == Skills.PRISONER_SWEEP) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    charge_events = events[(events.skillid == Skills.CHARGE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    guldhem_stun_events = events[(events.skillid == Skills.ANGUISHED_BOLT) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    inevitable_betrayl_events = events[(events.skillid == Skills.INEVITABLE_BETRAYL) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    bludgeon_events = events[(events.skillid == Skills.BLUDGEON) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    fixate_events = events[(events.skillid == Skills.SAMAROG_FIXATE) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    small_friend_events = events[(events.skillid == Skills.SMALL_FRIEND) & events.dst_instid.isin(players.index) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    big_friend_events = events[(events.skillid == Skills.BIG_FRIEND) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    spear_impact_events = events[(events.skillid == Skills.SPEAR_IMPACT) & events.dst_instid.isin(players.index) & (events.value > 0)]
-
-    gather_count_stat('Claw', collector, True, True, phases, subgroups, players, claw_events)
-    gather_count_stat('Shockwave', collector, True, True, phases, subgroups, players, shockwave_events)
-    gather_count_stat('Prisoner Sweep', collector, True, True, phases, subgroups, players, sweep_events)
-    gather_count_stat('Charge', collector, True, False, phases, subgroups, players, charge_events)
-    gather_count_stat('Anguished Bolt', collector, True, False, phases, subgroups, players, guldhem_stun_events)
-    gather_count_stat('Inevitable Betrayl', collector, True, False, phases, subgroups, players, inevitable_betrayl_events)
-    gather_count_stat('Bludgeon', collector, True, False, phases, subgroups, players, bludgeon_events)
-    gather_count_stat('Fixate', collector, True, True, phases, subgroups, players, fixate_events)
-    gather_count_stat('Small Friend', collector, True, True, phases, subgroups, players, small_friend_events)
-    gather_count_stat('Big Friend', collector, True, True, phases, subgroups, players, big_friend_events)
-    gather_count_stat('Spear Impact', collector, True, True, phases, subgroups, players, spear_impact_events)
-
-def gather_deimos_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    annihilate_events = events[(events.skillid == Skills.ANNIHILATE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    soul_feast_events = events[(events.skillid == Skills.SOUL_FEAST) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    mind_crush_events = events[(events.skillid == Skills.MIND_CRUSH) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    rapid_decay_events = events[(events.skillid == Skills.RAPID_DECAY) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    shockwave_events = events[(events.skillid == Skills.DEMONIC_SHOCKWAVE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    teleport_events = events[(events.skillid == Skills.DEIMOS_TELEPORT) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    tear_consumed_events = events[(events.skillid == Skills.TEAR_CONSUMED) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-
-    gather_count_stat('Annihilate', collector, True, False, phases, subgroups, players, annihilate_events)
-    gather_count_stat('Soul Feast', collector, True, False, phases, subgroups, players, soul_feast_events)
-    gather_count_stat('Mind Crush', collector, True, False, phases, subgroups, players, mind_crush_events)
-    gather_count_stat('Rapid Decay', collector, True, False, phases, subgroups, players, rapid_decay_events)        
-    gather_count_stat('Demonic Shockwave', collector, True, False, phases, subgroups, players, shockwave_events) 
-    gather_count_stat('Teleports', collector, True, False, phases, subgroups, players, teleport_events)
-    gather_count_stat('Tear Consumed', collector, True, False, phases, subgroups, players, tear_consumed_events)
-
-def gather_ca_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    pulverize_events = events[(events.skillid == Skills.PULVERIZE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    falling_junk_events_1 = events[(events.skillid == Skills.JUNK_FALL_1) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    falling_junk_events_2 = events[(events.skillid == Skills.JUNK_FALL_2) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    junk_absorb_events = events[(events.skillid == Skills.JUNK_ABSORPTION) & events.dst_instid.isin(players.index) & (events.value > 0) ]
-
-    gather_count_stat('Pulverize', collector, True, False, phases, subgroups, players, pulverize_events)
-    gather_count_stat('Junk Fall', collector, True, False, phases, subgroups, players, falling_junk_events_1 + falling_junk_events_2)
-    gather_count_stat('Junk Absorption', collector, True, False, phases, subgroups, players, junk_absorb_events)
-
-def gather_largos_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    waterlogged_events = events[(events.skillid == Skills.WATERLOGGED) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    
-    #kenut
-    tornado_events = events[(events.skillid == Skills.AQUATIC_VORTEX) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    wave_events = events[(events.skillid == Skills.SEA_SWELL) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    steal_events = events[(events.skillid == Skills.VAPOR_JET) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    kenut_aura_events = events[(events.skillid == Skills.AQUATIC_AURA_KENUT) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-
-    #nikare
-    charge_events = events[(events.skillid == Skills.VAPOR_RUSH) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    #pool_events = events[(events.skillid == Skills.TIDAL_POOL) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    kb_events = events[(events.skillid == Skills.GEYSER) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    bomb_events = events[(events.skillid == Skills.WATER_BOMB) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    float_events = events[(events.skillid == Skills.AQUATIC_DETAINMENT) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    nikare_aura_events = events[(events.skillid == Skills.AQUATIC_AURA_NIKARE) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-
-    gather_count_stat('Waterlogged', collector, True, False, phases, subgroups, players, waterlogged_events)
-    gather_count_stat('Vapor Rush', collector, True, False, phases, subgroups, players, charge_events)
-    gather_count_stat('Geyser', collector, True, False, phases, subgroups, players, kb_events)
-    gather_count_stat('Water Bomb', collector, True, False, phases, subgroups, players, bomb_events)
-    gather_count_stat('Aquatic Detainment', collector, True, False, phases, subgroups, players, float_events)
-    gather_count_stat('Aquatic Aura (Nikare)', collector, True, False, phases, subgroups, players, nikare_aura_events)
-    gather_count_stat('Aquatic Vortex', collector, True, False, phases, subgroups, players, tornado_events)
-    gather_count_stat('Sea Swell', collector, True, False, phases, subgroups, players, wave_events)
-    gather_count_stat('Vapor Jet', collector, True, False, phases, subgroups, players, steal_events)
-    gather_count_stat('Aquatic Aura (Kenut)', collector, True, False, phases, subgroups, players, kenut_aura_events)
-
-def gather_qadim_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end):
-    lamp_events = events[(events.skillid == Skills.POWER_OF_THE_LAMP) & events.dst_instid.isin(players.index) & (events.buff == 1) & (events.is_buffremove == 0)]
-    hitbox_events = events[(events.skillid == Skills.SEA_OF_FLAME) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    kb_events = events[(events.skillid == Skills.FLAME_WAVE) & events.dst_instid.isin(players.index) & (events.value > 0)]
-    shockwave_qadim_events = events[(events.skillid == Skills.FIRE_WAVE_QADIM) & events.dst_instid.isin(players.index) & (events.value > 0)]
-
-    dance_events_1 = events[(events.skillid == Skills.FIERY_DANCE_1) & events.dst_instid.isin(players.index) & (events.value >0 )]
-    dance_events_2 = events[(events.skillid == Skills.FIERY_DANCE_2) & events.dst_instid.isin(players.index) & (events.value >0 )]
-    dance_events_3 = events[(events.skillid == Skills.FIERY_DANCE_3) & events.dst_instid.isin(players.index) & (events.value >0 )]
-    dance_events_4 = events[(events.skillid == Skills.FIERY_DANCE_4) & events.dst_instid.isin(players.index) & (events.value >0 )]
-    dance_events = dance_events_1 + dance_events_2 + dance_events_3 + dance_events_4
-
-    gather_count_stat('Power of the Lamp', collector, True, False, phases, subgroups, players, lamp_events)
-    gather_count_stat('Sea of Flame', collector, True, False, phases, subgroups, players, hitbox_events)
-    gather_count_stat('Flame Wave', collector, True, False, phases, subgroups, players, kb_events)
-    gather_count_stat('Fire Wave', collector, True, False, phases, subgroups, players, shockwave_qadim_events)
-    gather_count_stat('Fiery Dance', collector, True, False, phases, subgroups, players, dance_events)
+CAIRN_MECHANICS = [
+    Mechanic('Displacement', Skills.DISPLACEMENT, hits_player),
+    Mechanic('Meteor Swarm', Skills.METEOR_SWARM, hits_player, dedupe_window=1000),
+    Mechanic('Spatial Manipulation', Skills.SPATIAL_MANIPULATION, hits_player),
+    Mechanic('Shared Agony', Skills.SHARED_AGONY, buff_applied_to_player)
+]
+
+def gather_cairn_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(CAIRN_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+
+MO_MECHANICS = [
+    Mechanic('Protect', Skills.PROTECT, buff_removed_from_player),
+    Mechanic('Claim', Skills.CLAIM, buff_removed_from_player),
+    Mechanic('Dispel', Skills.DISPEL, buff_removed_from_player),
+    Mechanic('Soldiers', Skills.SOLDIERS_AURA, by_player=False, calculation=lambda e: e.src_instid.nunique()),
+    Mechanic('Soldier\'s Aura', Skills.SOLDIERS_AURA, hits_player),
+    Mechanic('Enemy Tile', Skills.ENEMY_TILE, reaches_player)
+]
+
+def gather_mursaat_overseer_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(MO_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+SAMAROG_MECHANICS = [
+    Mechanic('Claw', Skills.SAMAROG_CLAW, hits_player, by_phase=True),
+    Mechanic('Shockwave', Skills.SHOCKWAVE, hits_player, by_phase=True),
+    Mechanic('Prisoner Sweep', Skills.PRISONER_SWEEP, hits_player, by_phase=True),
+    Mechanic('Charge', Skills.CHARGE, hits_player),
+    Mechanic('Anguished Bolt', Skills.ANGUISHED_BOLT, hits_player),
+    Mechanic('Inevitable Betrayl', Skills.INEVITABLE_BETRAYL, hits_player),
+    Mechanic('Bludgeon', Skills.BLUDGEON, hits_player),
+    Mechanic('Fixate', Skills.SAMAROG_FIXATE, buff_applied_to_player, by_phase=True),
+    Mechanic('Small Friend', Skills.SMALL_FRIEND, hits_player, by_phase=True),
+    Mechanic('Big Friend', Skills.BIG_FRIEND, buff_applied_to_player, by_phase=True),
+    Mechanic('Spear Impact', Skills.SPEAR_IMPACT, hits_player, by_phase=True)
+]
+
+def gather_samarog_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(SAMAROG_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+DEIMOS_MECHANICS = [
+    Mechanic('Annihilate', Skills.ANNIHILATE, hits_player),
+    Mechanic('Soul Feast', Skills.SOUL_FEAST, hits_player),
+    Mechanic('Mind Crush', Skills.MIND_CRUSH, hits_player),
+    Mechanic('Rapid Decay', Skills.RAPID_DECAY, hits_player),
+    Mechanic('Demonic Shockwave', Skills.DEMONIC_SHOCKWAVE, hits_player),
+    Mechanic('Teleports', Skills.DEIMOS_TELEPORT, buff_applied_to_player),
+    Mechanic('Tear Consumed', Skills.TEAR_CONSUMED, buff_applied_to_player)
+]
+
+def gather_deimos_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(DEIMOS_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+CA_MECHANICS = [
+    Mechanic('Pulverize', Skills.PULVERIZE, hits_player),
+    Mechanic('Junk Fall', {Skills.JUNK_FALL_1, Skills.JUNK_FALL_2}, hits_player),
+    Mechanic('Junk Absorption', Skills.JUNK_ABSORPTION, hits_player)
+]
+
+def gather_ca_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(CA_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+LARGOS_MECHANICS = [
+    Mechanic('Waterlogged', Skills.WATERLOGGED, buff_applied_to_player),
+    Mechanic('Vapor Rush', Skills.VAPOR_RUSH, hits_player),
+    #Mechanic('Tidal Pool', Skills.TIDAL_POOL, hits_player)
+    Mechanic('Geyser', Skills.GEYSER, hits_player),
+    Mechanic('Water Bomb', Skills.WATER_BOMB, buff_applied_to_player),
+    Mechanic('Aquatic Detainment', Skills.AQUATIC_DETAINMENT, hits_player),
+    Mechanic('Aquatic Aura (Nikare)', Skills.AQUATIC_AURA_NIKARE, buff_applied_to_player),
+    Mechanic('Aquatic Vortex', Skills.AQUATIC_VORTEX, hits_player),
+    Mechanic('Sea Swell', Skills.SEA_SWELL, hits_player),
+    Mechanic('Vapor Jet', Skills.VAPOR_JET, hits_player),
+    Mechanic('Aquatic Aura (Kenut)', Skills.AQUATIC_AURA_KENUT, buff_applied_to_player)
+]
+
+def gather_largos_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(LARGOS_MECHANICS, collector, subgroups, players, bosses, phases, index)
+
+QADIM_MECHANICS = [
+    Mechanic('Power of the Lamp', Skills.POWER_OF_THE_LAMP, buff_applied_to_player),
+    Mechanic('Sea of Flame', Skills.SEA_OF_FLAME, hits_player),
+    Mechanic('Flame Wave', Skills.FLAME_WAVE, hits_player),
+    Mechanic('Fire Wave', Skills.FIRE_WAVE_QADIM, hits_player),
+    Mechanic('Fiery Dance', {Skills.FIERY_DANCE_1, Skills.FIERY_DANCE_2, Skills.FIERY_DANCE_3, Skills.FIERY_DANCE_4}, hits_player)
+]
+
+def gather_qadim_stats(events, collector, agents, subgroups, players, bosses, phases, encounter_end, index, buffs):
+    gather_mechanics(QADIM_MECHANICS, collector, subgroups, players, bosses, phases, index)
@@ -2,6 +2,8 @@ from enum import IntEnum
 from evtcparser import *
 import pandas as pd
 import numpy as np
+from .splits import DurationIndex
+from .intervals import on_intervals
 
 class StackType(IntEnum):
     INTENSITY = 0
@@ -72,6 +74,21 @@ BUFF_TYPES = [
     ]
 
 BUFFS = { buff.name: buff for buff in BUFF_TYPES }
+
+class BuffRegistry:
+    # Lookups over a list of buff types. Each type's ordinal is its position
+    # in the list, and doubles as its code in the categorical buff column.
+    def __init__(self, buff_types):
+        self.buff_types = list(buff_types)
+        self.by_skillid = {}
+        for buff_type in self.buff_types:
+            for skillid in buff_type.skillid:
+                self.by_skillid.setdefault(skillid, buff_type)
+        self.skillids = np.array(sorted(self.by_skillid))
+        self.categories = pd.CategoricalDtype([buff_type.code for buff_type in self.buff_types])
+
+BUFF_REGISTRY = BuffRegistry(BUFF_TYPES)
+
 BUFF_TABS = [
     {
         'name': 'Overview',
@@ -181,31 +198,31 @@ class BuffTrackIntensity:
         tracker[1] = new_count 
         tracker[2] = time
 
-    def add_event(self, event):
-        if event.time != self.current_time:
-            self.simulate_to_time(event.time)
+    def add_event(self, time, value, is_buffremove, is_offcycle, src_instid):
+        if time != self.current_time:
+            self.simulate_to_time(time)
 
-        if event.is_buffremove:
-            self.clear(event.time)
-        elif event.is_offcycle:
-            if self.last_extend_time != event.time:
+        if is_buffremove:
+            self.clear(time)
+        elif is_offcycle:
+            if self.last_extend_time != time:
                 for stack in self.stack_durations:
-                    stack[0] += event.value
+                    stack[0] += value
                     if stack[1] == 0:
-                        stack[2] += event.value;
-                self.last_extend_time = event.time;
+                        stack[2] += value;
+                self.last_extend_time = time;
         elif len(self.stack_durations) < self.buff_type.capacity:
-            end_time = event.time + event.value;
-            self.stack_durations.append([end_time, event.ult_src_instid, end_time])
+            end_time = time + value;
+            self.stack_durations.append([end_time, src_instid, end_time])
             self.stack_durations.sort()
-            self.apply_change(event.time, self.src_trackers[event.ult_src_instid][1] + 1, event.ult_src_instid)
-        elif self.stack_durations[0][0] < event.time + event.value:
+            self.apply_change(time, self.src_trackers[src_instid][1] + 1, src_instid)
+        elif self.stack_durations[0][0] < time + value:
             old_src = self.stack_durations[0][1]
-            if old_src != event.ult_src_instid:
-                self.apply_change(event.time, self.src_trackers[old_src][1] - 1, old_src)
-                self.apply_change(event.time, self.src_trackers[event.ult_src_instid][1] + 1, event.ult_src_instid)
-            end_time = event.time + event.value;
-            self.stack_durations[0] = [end_time, event.ult_src_instid, end_time]
+            if old_src != src_instid:
+                self.apply_change(time, self.src_trackers[old_src][1] - 1, old_src)
+                self.apply_change(time, self.src_trackers[src_instid][1] + 1, src_instid)
+            end_time = time + value;
+            self.stack_durations[0] = [end_time, src_instid, end_time]
             self.stack_durations.sort()            
 
     def clear(self, time):
@@ -263,40 +280,40 @@ class BuffTrackDuration:
         tracker[1] = time
         tracker[2] = count
         
-    def add_event(self, event):
-        if event.time != self.current_time:
-            self.simulate(event.time - self.current_time)
+    def add_event(self, time, value, is_buffremove, is_offcycle, src_instid):
+        if time != self.current_time:
+            self.simulate(time - self.current_time)
 
-        if event.is_buffremove:
-            self.clear(event.time)
-        elif event.is_offcycle:
+        if is_buffremove:
+            self.clear(time)
+        elif is_offcycle:
             if len(self.stack_durations) > 0:
-                self.stack_durations[0][0] += event.value
+                self.stack_durations[0][0] += value
                 if self.stack_durations[0][1] != 0:
-                    self.stack_durations[0][2] += event.value
+                    self.stack_durations[0][2] += value
                 self.stack_durations.sort()
                 if self.stack_durations[0][1] != self.current_src:
-                    self.apply_change(event.time, self.current_src)
-                    self.apply_change(event.time, self.stack_durations[0][1])
+                    self.apply_change(time, self.current_src)
+                    self.apply_change(time, self.stack_durations[0][1])
                     self.current_src = self.stack_durations[0][1]
         elif len(self.stack_durations) < self.buff_type.capacity:
-            self.stack_durations.append([event.value, event.ult_src_instid, 0])
+            self.stack_durations.append([value, src_instid, 0])
             if len(self.stack_durations) == 1:
-                self.apply_change(event.time, self.stack_durations[0][1])
+                self.apply_change(time, self.stack_durations[0][1])
                 self.current_src = self.stack_durations[0][1]
             else:
                 self.stack_durations.sort()
                 if self.stack_durations[0][1] != self.current_src:
-                    self.apply_change(event.time, self.current_src)
-                    self.apply_change(event.time, self.stack_durations[0][1])
+                    self.apply_change(time, self.current_src)
+                    self.apply_change(time, self.stack_durations[0][1])
                     self.current_src = self.stack_durations[0][1]
                     
-        elif self.stack_durations[0][0] < event.value:
-            self.stack_durations[0] = [event.value, event.ult_src_instid, 0]
+        elif self.stack_durations[0][0] < value:
+            self.stack_durations[0] = [value, src_instid, 0]
             self.stack_durations.sort()
             if self.stack_durations[0][1] != self.current_src:
-                self.apply_change(event.time, self.current_src)
-                self.apply_change(event.time, self.stack_durations[0][1])           
+                self.apply_change(time, self.current_src)
+                self.apply_change(time, self.stack_durations[0][1])           
                 self.current_src = self.stack_durations[0][1]
                 
     def simulate(self, delta_time):
@@ -348,30 +365,44 @@ class BuffTrackDuration:
 class BuffPreprocessor:
 
     def process_events(self, start_time, end_time, skills, players, player_events):
-        def process_buff_events(buff_type, buff_events, raw_buff_data):
-            for player in list(players.index):
-                relevent_events = buff_events[buff_events['dst_instid'] == player]
-
-                agent_start_time = self.get_time(player_events[player_events['src_instid'] == player], parser.StateChange.SPAWN, start_time)
-                agent_end_time = self.get_time(player_events[player_events['src_instid'] == player], parser.StateChange.DESPAWN, end_time)
-                if len(relevent_events) > 0:
-                    if relevent_events.time.min() < agent_start_time:
-                        agent_start_time = start_time
-                    if relevent_events.time.max() > agent_end_time:
-                        agent_end_time = end_time
-
+        def process_buff_events(buff_type, first, last, raw_buff_data):
+            # events of one buff are contiguous in the sorted columns, and
+            # within them the events of each player, still in time order, so
+            # a player's first and last events bound the times of the rest
+            player_bounds = np.searchsorted(dst_instids[first:last], player_ids) + first
+            player_ends = np.searchsorted(dst_instids[first:last], player_ids, side='right') + first
+            has_events = player_ends > player_bounds
+            first_times = np.where(has_events, times[np.minimum(player_bounds, len(times) - 1)], 0).tolist()
+            last_times = np.where(has_events, times[np.maximum(player_ends - 1, 0)], 0).tolist()
+            for player, begin, end, first_time, last_time, agent_start_time, agent_end_time in zip(
+                    player_ids.tolist(), player_bounds.tolist(), player_ends.tolist(),
+                    first_times, last_times, agent_start_times, agent_end_times):
+                if end == begin:
+                    # with nothing to simulate, a duration track only records
+                    # the player holding no stacks while present
+                    if buff_type.stacking == StackType.DURATION and agent_end_time > agent_start_time:
+                        raw_buff_data.append([agent_start_time, agent_end_time - agent_start_time, buff_type.code, 0, player, 0])
+                    continue
+
+                if first_time < agent_start_time:
+                    agent_start_time = start_time
+                if last_time > agent_end_time:
+                    agent_end_time = end_time
+
+                sources = pd.unique(src_instids[begin:end]).tolist()
                 if (buff_type.stacking == StackType.INTENSITY):
-                    bufftrack = BuffTrackIntensity(BUFFS[buff_type.name], player, relevent_events['ult_src_instid'].drop_duplicates().tolist(), agent_start_time, agent_end_time)
+                    bufftrack = BuffTrackIntensity(buff_type, player, sources, agent_start_time, agent_end_time)
                 else:
-                    bufftrack = BuffTrackDuration(BUFFS[buff_type.name], player, relevent_events['ult_src_instid'].drop_duplicates().tolist(), agent_start_time, agent_end_time)
+                    bufftrack = BuffTrackDuration(buff_type, player, sources, agent_start_time, agent_end_time)
 
-                for event in relevent_events.itertuples():
-                    bufftrack.add_event(event)
+                for event in zip(times[begin:end].tolist(), values[begin:end].tolist(),
+                                 buffremoves[begin:end].tolist(), offcycles[begin:end].tolist(),
+                                 src_instids[begin:end].tolist()):
+                    bufftrack.add_event(*event)
                 bufftrack.end_track(agent_end_time)
 
-                raw_buff_data = raw_buff_data + bufftrack.data
-            return raw_buff_data
-       
+                raw_buff_data.extend(bufftrack.data)
+
         # Filter out state change and cancellation events
         not_cancel_events = player_events[(player_events.state_change == parser.StateChange.NORMAL)
                                         & (player_events.is_activation < parser.Activation.CANCEL_FIRE)
@@ -397,38 +428,165 @@ class BuffPreprocessor:
         #statusremove_events = not_cancel_events[not_cancel_events.is_buffremove == 1]
         buffremove_events = statusremove_events[['skillid', 'time', 'value', 'overstack_value', 'is_buffremove', 'dst_instid', 'ult_src_instid']]
 
-        # Combine buff application and removal events
+        # Combine buff application and removal events of the tracked buffs
         buff_update_events = pd.concat([buff_events, buffremove_events], sort=False).sort_values('time')
+        buff_update_events = buff_update_events[buff_update_events['skillid'].isin(BUFF_REGISTRY.skillids)]
 
         # Add in skill ids for ease of processing
         buff_update_events[['time', 'value']] = buff_update_events[['time', 'value']].apply(pd.to_numeric)
 
-        raw_buff_data = []
+        # Sort the columns by buff and player once, keeping time order within
+        # each, so the trackers can be fed from plain array slices
+        order = np.lexsort((buff_update_events['dst_instid'].values, buff_update_events['skillid'].values))
+        skillids = buff_update_events['skillid'].values[order]
+        dst_instids = buff_update_events['dst_instid'].values[order]
+        times = buff_update_events['time'].values[order]
+        values = buff_update_events['value'].values[order]
+        buffremoves = buff_update_events['is_buffremove'].values[order]
+        offcycles = buff_update_events['is_offcycle'].values[order]
+        src_instids = buff_update_events['ult_src_instid'].values[order]
+
+        # when each player is present, looked up once for every buff
+        spawn_times = self.get_times(player_events, parser.StateChange.SPAWN)
+        despawn_times = self.get_times(player_events, parser.StateChange.DESPAWN)
+        player_ids = np.array(list(players.index))
+        agent_start_times = [spawn_times.get(player, start_time) for player in player_ids.tolist()]
+        agent_end_times = [despawn_times.get(player, end_time) for player in player_ids.tolist()]
 
-        groups = buff_update_events.groupby('skillid')
+        raw_buff_data = []
 
-        remaining_buff_types = list(BUFF_TYPES)
-        for skillid, buff_events in groups:
+        unique_skillids, skill_starts = np.unique(skillids, return_index=True)
+        skill_ends = np.append(skill_starts[1:], len(skillids))
 
-            relevant_buff_types = list(filter(lambda a: skillid in a.skillid, remaining_buff_types))
-            if not relevant_buff_types:
+        # a buff type is only tracked from the first of its skill ids present
+        processed_codes = set()
+        for skillid, first, last in zip(unique_skillids.tolist(), skill_starts.tolist(), skill_ends.tolist()):
+            buff_type = BUFF_REGISTRY.by_skillid.get(skillid)
+            if buff_type is None or buff_type.code in processed_codes:
                 continue
-            
-            buff_type = relevant_buff_types[0]
-            remaining_buff_types.remove(buff_type)
-            raw_buff_data = process_buff_events(buff_type, buff_events, raw_buff_data)
+
+            processed_codes.add(buff_type.code)
+            process_buff_events(buff_type, first, last, raw_buff_data)
 
         buff_data = pd.DataFrame(columns = ['time', 'duration', 'buff', 'src_instid', 'dst_instid', 'stacks'], data = raw_buff_data)
         buff_data.fillna(0, inplace=True)
         buff_data[['time', 'duration', 'src_instid', 'dst_instid', 'stacks']] = buff_data[['time', 'duration', 'src_instid', 'dst_instid', 'stacks']].apply(pd.to_numeric)
+        buff_data['buff'] = buff_data['buff'].astype(BUFF_REGISTRY.categories)
         buff_data.sort_values('time', inplace=True, axis=0)
         return buff_data;
     
     #format: time, duration, buff_type, src, dst, stacks 
     
-    def get_time(self, player_events, state, start_time):
-        event = player_events[player_events['state_change'] == state]
-        if len(event) > 0:
-            return event.iloc[0]['time']
-        return start_time
-        
+    def get_times(self, player_events, state):
+        # time of each agent's first event of the given state
+        events = player_events[player_events['state_change'] == state]
+        times = {}
+        for instid, time in zip(events['src_instid'].tolist(), events['time'].tolist()):
+            times.setdefault(instid, time)
+        return times
+
+def step_timelines(steps, keys):
+    # timelines out of a frame of stack changes: its key columns, a time and
+    # the step in stacks at that time. Changes at the same time are netted
+    # off, so every step left moves the count; a running total within each
+    # key is then the count itself
+    steps = steps.groupby(keys + ['time'], observed=True)['step'].sum()
+    steps = steps[steps != 0].reset_index()
+    first = np.ones(len(steps), dtype=bool)
+    if len(steps) > 1:
+        first[1:] = False
+        for key in keys:
+            values = steps[key].values
+            first[1:] |= values[1:] != values[:-1]
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], len(steps))
+    totals = steps['step'].values.cumsum()
+    before = totals[starts] - steps['step'].values[starts]
+    counts = totals - np.repeat(before, ends - starts)
+
+    times = steps['time'].values.astype(np.int64)
+    timelines = {}
+    for key, start, end in zip(zip(*[steps[key].values[starts].tolist() for key in keys]), starts.tolist(), ends.tolist()):
+        timelines[key] = (times[start:end], counts[start:end])
+    return timelines
+
+class BuffTimelines:
+    # Buff state of an encounter, built once and shared by the analyser, the
+    # boss metrics and the replay. It holds the preprocessed buff segments
+    # (indexed for clipping to phases) and stack counts over time: a
+    # timeline is the times at which an agent's stacks of a buff change and
+    # the count from each of those times on, summed over sources or for a
+    # single source. Timelines of each kind are built the first time one is
+    # asked for. Boss buffs the preprocessor does not simulate are added from
+    # their events by the metrics that need them, keyed by skill id.
+    def __init__(self, buff_data):
+        self.buff_data = buff_data
+        self.segments = DurationIndex(buff_data)
+        self._timelines = {}
+        self._added = {}
+
+    def _build(self, keys):
+        data = self.buff_data[self.buff_data['stacks'] != 0]
+        stacks = data['stacks'].values
+        steps = pd.concat([data[keys], data[keys]], ignore_index=True)
+        steps['time'] = np.concatenate([data['time'].values, data['time'].values + data['duration'].values])
+        steps['step'] = np.concatenate([stacks, -stacks])
+        return step_timelines(steps, keys)
+
+    def add_toggled(self, buff, owners, times, on, end):
+        # a buff that is either held or not: it is gained at an on event and
+        # lost at the next off one, and whatever is held at end is lost then
+        intervals = on_intervals(owners, times, on, end)
+        owners = intervals['owner'].values
+        starts = intervals['time'].values.astype(np.int64)
+        steps = pd.DataFrame({'dst_instid': np.concatenate([owners, owners]),
+                              'time': np.concatenate([starts, starts + intervals['duration'].values.astype(np.int64)]),
+                              'step': np.repeat([1, -1], len(owners))})
+        for (owner,), timeline in step_timelines(steps, ['dst_instid']).items():
+            self._added[(owner, buff)] = timeline
+
+    def add_stacked(self, buff, owners, times, steps):
+        # a buff whose stacks change by the given steps in time order, and
+        # never drop below zero: a count floored at zero is the plain running
+        # total less the lowest (negative) value that total has reached
+        frame = pd.DataFrame({'owner': np.asarray(owners), 'time': np.asarray(times).astype(np.int64),
+                              'total': np.asarray(steps)})
+        by_owner = frame.groupby('owner', sort=False)
+        totals = by_owner['total'].cumsum()
+        floors = totals.groupby(frame['owner'], sort=False).cummin().clip(upper=0)
+        frame['count'] = (totals - floors).values
+        for owner, timeline in frame.groupby('owner', sort=False):
+            self._added[(owner, buff)] = (timeline['time'].values, timeline['count'].values)
+
+    def timeline(self, dst, buff, src=None):
+        if src is None and (dst, buff) in self._added:
+            return self._added[(dst, buff)]
+        keys = ['dst_instid', 'buff'] if src is None else ['dst_instid', 'buff', 'src_instid']
+        kind = len(keys)
+        if kind not in self._timelines:
+            self._timelines[kind] = self._build(keys)
+        key = (dst, buff) if src is None else (dst, buff, src)
+        return self._timelines[kind].get(key, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+
+    def stacks_at(self, dst, buff, time, src=None):
+        times, counts = self.timeline(dst, buff, src)
+        position = np.searchsorted(times, time, side='right') - 1
+        return int(counts[position]) if position >= 0 else 0
+
+    def max_stacks(self, dst, buff, start=None, end=None, src=None):
+        # the highest count held within [start, end): the one in effect at
+        # start, and every one taken up before end
+        times, counts = self.timeline(dst, buff, src)
+        low = 0 if start is None else max(np.searchsorted(times, start, side='right') - 1, 0)
+        high = len(times) if end is None else np.searchsorted(times, end, side='left')
+        return int(max(counts[low:high].max(), 0)) if high > low else 0
+
+    def uptime(self, dst, buff, start=None, end=None, src=None):
+        # time within [start, end] spent holding at least one stack, up to
+        # the timeline's last change
+        times, counts = self.timeline(dst, buff, src)
+        if len(times) == 0:
+            return 0
+        bounds = np.clip(times, start, end) if start is not None or end is not None else times
+        held = counts[:-1] > 0
+        return int((bounds[1:] - bounds[:-1])[held].sum())
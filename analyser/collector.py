@@ -1,4 +1,7 @@
 import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Filter:
     def __init__(self, conversion_function, context_function):
@@ -31,20 +34,78 @@ def mapped_to(name):
 
 all_data_types = set()
 
+class DataRows:
+    """ Flat backing store of a collector tree: one (path, name, value) row per
+    add_data, where path alternates context keys and values in output order.
+    The nested dict is only built when asked for. """
+
+    def __init__(self):
+        self.paths = []
+        self.names = []
+        self.values = []
+        self._keys = set()
+        self._known_paths = set()
+        self._tree = {}
+        self._built = 0
+
+    def append(self, path, name, value):
+        # every key the nested dict will hold, so a clash is seen (and
+        # logged) when the value is added, as writing into the dict did
+        if path not in self._known_paths:
+            self._known_paths.add(path)
+            self._keys.update(path[:i] for i in range(1, len(path) + 1))
+        key = path + (name,)
+        if key in self._keys:
+            logger.debug("Clash for %s:%s", path, name)
+        self._keys.add(key)
+        self.paths.append(path)
+        self.names.append(name)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return zip(self.paths, self.names, self.values)
+
+    def tree(self):
+        # later rows overwrite earlier ones, as writing straight into the
+        # nested dict did; rows added since the last call are merged in
+        for i in range(self._built, len(self.names)):
+            output_block = self._tree
+            for path_key in self.paths[i]:
+                output_block = DataRows._navigate(output_block, path_key)
+            output_block[self.names[i]] = self.values[i]
+        self._built = len(self.names)
+        return self._tree
+
+    @staticmethod
+    def _navigate(dictionary, key):
+        if key not in dictionary:
+            new_node = {}
+            dictionary[key] = new_node
+            return new_node
+        return dictionary[key]
+
 #NOTE: May want to add "range" style data to context levels, such as time or total damage?
 class Collector:
     """ Used for collecting data and automatically structuring it for output. """
 
-    def __init__(self, ordering, registrations, context, all_data, context_values):
+    def __init__(self, ordering, registrations, context, rows, context_values):
         self.ordering = ordering
         self.registrations = registrations
         self.context = context
-        self.all_data = all_data
+        self.rows = rows
         self.context_values = context_values
+        self._path = None
 
     @classmethod
     def root(cls, ordering):
-        return cls(ordering, [], {}, {}, {})
+        return cls(ordering, [], {}, DataRows(), {})
+
+    @property
+    def all_data(self):
+        return self.rows.tree()
 
     def group(self, function, data, *group_mappings):
         if not group_mappings:
@@ -74,21 +135,11 @@ class Collector:
             except:
                 value = type_function.apply(value, self.context_values)
 
-        output_block = self.all_data
-        sorted_context = [key for key in self.ordering if key in self.context] + sorted([
-            key for key in self.context if key not in self.ordering])
-
-
-
+        path, last_value = self._context_path()
         if name == None:
-            name = self.context[sorted_context.pop()]
-
-        for path_key in sorted_context:
-            output_block = Collector._navigate(output_block, path_key)
-            output_block = Collector._navigate(output_block, self.context[path_key])
-        if name in output_block:
-            print("Clash for {0}:{1}".format(self.context, name))
-        output_block[name] = value
+            name = last_value
+            path = path[:-2]
+        self.rows.append(path, name, value)
 
     def with_key(self, key, value):
         new_context = dict(self.context)
@@ -96,16 +147,21 @@ class Collector:
         return Collector(self.ordering,
                          self.registrations,
                          new_context,
-                         self.all_data,
+                         self.rows,
                          dict(self.context_values))
 
     def set_context_value(self, key, value):
         self.context_values[key] = value
 
-    @staticmethod
-    def _navigate(dictionary, key):
-        if key not in dictionary:
-            new_node = {}
-            dictionary[key] = new_node
-            return new_node
-        return dictionary[key]
+    def _context_path(self):
+        # the context never changes after construction, so its sorted path
+        # is worked out once per collector rather than once per value
+        if self._path is None:
+            sorted_context = [key for key in self.ordering if key in self.context] + sorted([
+                key for key in self.context if key not in self.ordering])
+            path = []
+            for path_key in sorted_context:
+                path.append(path_key)
+                path.append(self.context[path_key])
+            self._path = (tuple(path), self.context[sorted_context[-1]] if sorted_context else None)
+        return self._path
@@ -0,0 +1,30 @@
+import numpy as np
+from .splits import RowsByValue
+
+# Row positions of an events frame grouped by the value of a column (skillid,
+# state_change, src_instid, ...). A column is grouped the first time it is
+# looked up, and every lookup after that is a slice of its groups instead of
+# a scan of the whole frame. Rows come back in their original order, as a
+# boolean mask would return them.
+
+class EventIndex:
+    def __init__(self, events):
+        self.events = events
+        self._columns = {}
+
+    def _grouped(self, column):
+        if column not in self._columns:
+            self._columns[column] = RowsByValue(self.events, column)
+        return self._columns[column]
+
+    def positions(self, column, values):
+        return self._grouped(column).positions([values] if np.isscalar(values) else values)
+
+    def rows(self, column, values):
+        return self.events.iloc[self.positions(column, values)]
+
+    def select(self, column, values, condition=None):
+        # rows with the given value(s) in column, narrowed by condition, a
+        # function from those rows to a mask over them
+        rows = self.rows(column, values)
+        return rows if condition is None else rows[condition(rows)]
@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+
+# State tracking over the event streams of many owners (players, bosses) at
+# once. Events come in time order; a stable sort by owner keeps that order
+# within each owner, and changes of state are found by comparing each event
+# with the one before it rather than by stepping through events one at a time.
+
+def _by_owner(owners, *columns):
+    owners = np.asarray(owners)
+    order = np.argsort(owners, kind='mergesort')
+    owners = owners[order]
+    first = np.ones(len(owners), dtype=bool)
+    first[1:] = owners[1:] != owners[:-1]
+    last = np.ones(len(owners), dtype=bool)
+    last[:-1] = first[1:]
+    return owners, first, last, [np.asarray(column)[order] for column in columns]
+
+def _carried(first, states, initial, hold):
+    # the state in effect after each event: events in hold leave the previous
+    # state (or initial, for an owner's first event) in place
+    changes = ~np.isin(states, list(hold))
+    values = np.where(changes, states, initial)
+    positions = np.where(changes | first, np.arange(len(states)), 0)
+    return values[np.maximum.accumulate(positions)] if len(states) else values
+
+def carried_states(owners, states, initial, hold=()):
+    # the state of each event's owner once that event has happened
+    owners, first, last, (positions, states) = _by_owner(owners, np.arange(len(owners)), states)
+    carried = np.empty(len(states), dtype=np.result_type(states, np.asarray(initial)))
+    carried[positions] = _carried(first, states, initial, hold)
+    return carried
+
+def state_segments(owners, times, states, end, initial, hold=()):
+    # the state each owner is in from each of its events until the next one,
+    # or until end after its last event. Every event moves its owner into its
+    # own state, except those in hold, which split the segment but leave the
+    # state as it was. next_state is the state of the event ending the
+    # segment, -1 for segments still open at end.
+    owners, first, last, (times, states) = _by_owner(owners, times, states)
+    segment_ends = np.empty(len(times), dtype=np.result_type(times, np.asarray(end)))
+    segment_ends[:-1] = times[1:]
+    segment_ends[last] = end
+    next_states = np.empty(len(states), dtype=np.int64)
+    next_states[:-1] = states[1:]
+    next_states[last] = -1
+    return pd.DataFrame({
+        'owner': owners,
+        'time': times,
+        'state': _carried(first, states, initial, hold),
+        'duration': segment_ends - times,
+        'next_state': next_states,
+    }, columns=['owner', 'time', 'state', 'duration', 'next_state'])
+
+def on_intervals(owners, times, on, end=None):
+    # the intervals each owner spends switched on: an interval opens at an on
+    # event following an off one (or none) and closes at the next off event;
+    # repeated ons or offs change nothing. Intervals still open after an
+    # owner's last event run to end, or are left out when end is None.
+    owners, first, last, (times, on) = _by_owner(owners, times, np.asarray(on, dtype=bool))
+    was_on = np.zeros(len(on), dtype=bool)
+    was_on[1:] = on[:-1]
+    was_on &= ~first
+    opens = np.flatnonzero(on & ~was_on)
+
+    # opens and closes alternate within an owner, so once the intervals left
+    # open are given a close at their owner's last event they pair in order
+    left_open = last & on
+    closes = np.flatnonzero((~on & was_on) | left_open)
+    close_times = times[closes]
+    if end is None:
+        kept = ~left_open[closes]
+        opens, closes, close_times = opens[kept], closes[kept], close_times[kept]
+    else:
+        close_times = np.where(left_open[closes], end, close_times)
+    return pd.DataFrame({
+        'owner': owners[opens],
+        'time': times[opens],
+        'duration': close_times - times[opens],
+    }, columns=['owner', 'time', 'duration'])
+
+def burst_starts(keys, times, window):
+    # which events start a burst: the first event of their group, or one
+    # more than window after the previous event of the same group. keys is a
+    # list of arrays identifying each event's group, window a single value or
+    # one per event. The mask comes back in the order the events were given.
+    times = np.asarray(times)
+    if times.dtype.kind == 'u':
+        times = times.astype(np.int64)
+    order = np.lexsort([times] + [np.asarray(key) for key in reversed(keys)])
+    window = np.broadcast_to(window, times.shape)[order]
+
+    sorted_times = times[order]
+    starts = np.ones(len(order), dtype=bool)
+    if len(order) > 1:
+        new_group = np.zeros(len(order) - 1, dtype=bool)
+        for key in keys:
+            key = np.asarray(key)[order]
+            new_group |= key[1:] != key[:-1]
+        starts[1:] = new_group | (sorted_times[1:] - sorted_times[:-1] > window[1:])
+
+    mask = np.empty(len(order), dtype=bool)
+    mask[order] = starts
+    return mask
@@ -1,16 +1,19 @@
 __author__ = 'Owner'
 from analyser.analyser import Archetype
 from analyser.buffs import BUFF_TYPES
+import logging
+
+logger = logging.getLogger(__name__)
 
 def something(participation, data):
     all_phase_stats = data['Category']['combat']['Phase']['All']
     all_to_boss = all_phase_stats['Subgroup']['*All']
 
-    print("Revising archetype for character ", participation.character)
+    logger.debug("Revising archetype for character %s", participation.character)
     player_stats = all_phase_stats['Player'][participation.character]
 
     damage_stats = player_stats['Metrics']['damage']['To']['*Boss']
-    print(damage_stats)
+    logger.debug("%s", damage_stats)
     condi = damage_stats['condi_dps']
     power = damage_stats['power_dps']
     total = damage_stats['dps']
@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Opt-in timing of the analyser's stages. Each stage records its wall time,
+# CPU time and the memory it left allocated, from tracemalloc snapshots taken
+# around it; tracing memory slows the analysis down, so none of this happens
+# unless profiling is asked for. Tracing is only started and stopped here
+# when nothing else in the process is tracing, and then the stage's peak is
+# recorded too; traces of any other tracer are left alone.
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+class StageProfiler:
+    def __init__(self, enabled=False, memory=True):
+        self.enabled = enabled
+        self.memory = memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = self.memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        before = _snapshot() if self.memory else None
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stage = {
+                'name': name,
+                'wall': time.perf_counter() - wall,
+                'cpu': time.process_time() - cpu,
+                'memory': None,
+                'peak_memory': None,
+            }
+            if self.memory:
+                stage['memory'] = sum(stat.size_diff for stat in _snapshot().compare_to(before, 'filename'))
+            if started_tracing:
+                stage['peak_memory'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stages.append(stage)
+
+    def total(self, key):
+        return sum(stage[key] for stage in self.stages)
+
+    def report(self):
+        lines = []
+        for stage in self.stages:
+            line = "{0:<40} {1:8.3f}s wall {2:8.3f}s cpu".format(stage['name'], stage['wall'], stage['cpu'])
+            if stage['memory'] is not None:
+                line += " {0:8.1f}MB kept".format(stage['memory'] / 1048576)
+            if stage['peak_memory'] is not None:
+                line += " {0:8.1f}MB peak".format(stage['peak_memory'] / 1048576)
+            lines.append(line)
+        lines.append("{0:<40} {1:8.3f}s wall {2:8.3f}s cpu".format("total", self.total('wall'), self.total('cpu')))
+        return "\n".join(lines)
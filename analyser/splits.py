@@ -27,6 +27,29 @@ class ContextType:
     BUFF_TYPE = "Buff"
     DESTINATIONS = "Destinations"
 
+class DurationIndex:
+    # Index over rows with a time and a duration, for clipping them to windows.
+    # Rows are kept in start order with a running maximum of their ends, so a
+    # window only needs to look at rows between two binary searches.
+    def __init__(self, events):
+        order = np.argsort(events['time'].values, kind='mergesort')
+        self.events = events.iloc[order]
+        self.times = self.events['time'].values
+        self.ends = self.times + self.events['duration'].values
+        self.max_ends = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    def clip(self, start, end):
+        # rows overlapping [start, end], trimmed to it; zero length rows are
+        # kept if they lie within it, including on its bounds
+        low = np.searchsorted(self.max_ends, start, side='left')
+        high = np.searchsorted(self.times, end, side='right')
+        times = self.times[low:high]
+        ends = self.ends[low:high]
+        selected = ((times < end) & (ends > start)) | ((times >= start) & (ends <= end))
+        times = np.maximum(times[selected], start)
+        ends = np.minimum(ends[selected], end)
+        return self.events.iloc[low:high][selected].assign(time = times, duration = ends - times)
+
 def split_duration_event_by_phase(collector, method, events, phases):
     def collect_phase(name, phase_events):
         duration = float(phase_events['time'].max() - phase_events['time'].min())/1000.0
@@ -42,30 +65,9 @@ def split_duration_event_by_phase(collector, method, events, phases):
     #Some things happen outside a phase.
     #Some fights have multiple phases, but you only get to phase one
     #Still want to list it as phase 1
-    for i in range(0,len(phases)):
-        phase = phases[i]
-        start = phase[1]
-        end = phase[2]
-
-        if len(events) > 0:
-            across_phase = events[(events['time'] < start) & (events['time'] + events['duration'] > end)]
-
-            #HACK: review why copy?
-            before_phase = events[(events['time'] < start) & (events['time'] + events['duration'] > start) & (events['time'] + events['duration'] <= end)].copy()
-            main_phase = events[(events['time'] >= start) & (events['time'] + events['duration'] <= end)]
-            after_phase = events[(events['time'] >= start) & (events['time'] < end) & (events['time'] + events['duration'] > end)]
-
-            across_phase = across_phase.assign(time = start, duration = end - start)
-
-            before_phase.loc[:, 'duration'] = before_phase['duration'] + before_phase['time'] - start
-            before_phase = before_phase.assign(time = start)
-
-            after_phase = after_phase.assign(duration = end)
-            after_phase.loc[:, 'duration'] = after_phase['duration'] - after_phase['time']
-
-            collect_phase(phase[0], across_phase.append(before_phase).append(main_phase).append(after_phase))
-        else:
-            collect_phase(phase[0], events)
+    index = DurationIndex(events)
+    for phase in phases:
+        collect_phase(phase[0], index.clip(phase[1], phase[2]))
                 
 def split_by_phase(collector, method, events, phases):
     def collect_phase(name, phase_events, duration):
@@ -87,29 +89,63 @@ def split_by_phase(collector, method, events, phases):
         phase_events = events[(events.time >= phase[1]) & (events.time <= phase[2])]
         collect_phase(phase[0], phase_events, (phase[2] - phase[1]) / 1000.0)
 
+def split_aggregates_by_phase(collector, method, aggregates, phases):
+    def collect_phase(name, phase_table, duration):
+        if not duration > 0.001:
+            duration = 0
+        collector.set_context_value(ContextType.DURATION, duration)
+        collector.with_key(Group.PHASE, name).run(method, phase_table)
+
+    collect_phase("All", aggregates.table(), float(aggregates.max_time - aggregates.min_time) / 1000.0)
+    for phase in phases:
+        collect_phase(phase[0], aggregates.table(phase[1], phase[2]), (phase[2] - phase[1]) / 1000.0)
+
+class RowsByValue:
+    # Row positions of a frame by the value of one of its columns, grouped
+    # once; the rows holding any of a set of values are then their positions
+    # merged back into frame order, as an isin mask would select them.
+    def __init__(self, events, column):
+        self.events = events
+        self.groups = events.groupby(column, sort=False).indices if len(events) else {}
+
+    def positions(self, values):
+        found = [self.groups[value] for value in set(values) if value in self.groups]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found)) if len(found) > 1 else found[0]
+
+    def rows(self, values):
+        return self.events.iloc[self.positions(values)]
+
+    def other_rows(self, values):
+        mask = np.ones(len(self.events), dtype=bool)
+        mask[self.positions(values)] = False
+        return self.events.iloc[np.flatnonzero(mask)]
+
 def split_by_player_groups(collector, method, events, player_column, subgroups, players):
+    by_player = RowsByValue(events, player_column)
     collector.set_context_value(ContextType.DESTINATIONS, len(players))
     collector.with_key(Group.SUBGROUP, "*All").run(method, events)
     for subgroup in subgroups:
         subgroup_players = subgroups[subgroup]
-        subgroup_events = events[events[player_column].isin(subgroup_players)]
+        subgroup_events = by_player.rows(subgroup_players)
         collector.set_context_value(ContextType.DESTINATIONS, len(subgroup_players))
         collector.with_key(Group.SUBGROUP, "{0}".format(subgroup)).run(
             method, subgroup_events)
-    split_by_player(collector, method, events, player_column, players)
+    split_by_player(collector, method, events, player_column, players, by_player)
 
-def split_by_player(collector, method, events, player_column, players):
-    for character in players.groupby('name').groups.items():
-        characters = players[players['name'] == character[0]]
+def split_by_player(collector, method, events, player_column, players, by_player=None):
+    if by_player is None:
+        by_player = RowsByValue(events, player_column)
+    for name, characters in players.groupby('name').groups.items():
         collector.set_context_value(ContextType.DESTINATIONS, 1)
-        collector.with_key(Group.PLAYER, character[0]).run(method,events[events[player_column].isin(characters.index)]) 
+        collector.with_key(Group.PLAYER, name).run(method, by_player.rows(characters))
 
 def split_by_agent(collector, method, events, group, enemy_column, bosses, players):
-    boss_events = events[events[enemy_column].isin(bosses)]
-    player_events = events[events[enemy_column].isin(players)]
-
-    non_add_instids = bosses
-    add_events = events[events[enemy_column].isin(non_add_instids) != True]
+    by_enemy = RowsByValue(events, enemy_column)
+    boss_events = by_enemy.rows(bosses)
+    player_events = by_enemy.rows(players)
+    add_events = by_enemy.other_rows(bosses)
 
     collector.with_key(group, "*All").run(method, events)
     collector.with_key(group, "*Boss").run(method, boss_events)
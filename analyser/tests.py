@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import pandas as pd
+from .bossmetrics import *
+from .buffs import BuffTimelines
+from .collector import Collector
+from .eventindex import EventIndex
+
+class MechanicCountTest(unittest.TestCase):
+    """ Mechanics counted over several skill ids, from a handful of hits. """
+
+    def setUp(self):
+        self.players = pd.DataFrame({'name': ['Player 1', 'Player 2']}, index=[1, 2])
+        self.subgroups = {1: [1], 2: [2]}
+
+    def gather(self, gather_stats, skillids, dst_instids):
+        events = pd.DataFrame({'time': [100 * i for i in range(len(skillids))],
+                               'skillid': skillids,
+                               'dst_instid': dst_instids,
+                               'value': 10,
+                               'buff': 0,
+                               'is_buffremove': 0})
+        collector = Collector.root([Group.CATEGORY, Group.PHASE, Group.PLAYER, Group.SUBGROUP, Group.METRICS])
+        gather_stats(events, collector, None, self.subgroups, self.players, [], [], events.time.max(), EventIndex(events), None)
+        return collector.all_data['Phase']['All']
+
+    def assertCounts(self, data, name, total, by_player):
+        self.assertEqual(data['Subgroup']['*All'][name], total)
+        for subgroup, player, count in by_player:
+            self.assertEqual(data['Subgroup'][str(subgroup)][name], count)
+            self.assertEqual(data['Player'][player][name], count)
+
+    def test_junk_fall_counts_both_skills_per_player(self):
+        # instid 3 is not a player, so its hit is not counted
+        data = self.gather(gather_ca_stats,
+                           [Skills.JUNK_FALL_1, Skills.JUNK_FALL_2, Skills.JUNK_FALL_2, Skills.PULVERIZE, Skills.JUNK_FALL_1],
+                           [1, 1, 2, 2, 3])
+        self.assertCounts(data, 'Junk Fall', 3, [(1, 'Player 1', 2), (2, 'Player 2', 1)])
+        self.assertCounts(data, 'Pulverize', 1, [(1, 'Player 1', 0), (2, 'Player 2', 1)])
+
+    def test_fiery_dance_counts_all_skills_per_player(self):
+        data = self.gather(gather_qadim_stats,
+                           [Skills.FIERY_DANCE_1, Skills.FIERY_DANCE_2, Skills.FIERY_DANCE_3, Skills.FIERY_DANCE_4, Skills.FIERY_DANCE_4],
+                           [1, 2, 2, 1, 2])
+        self.assertCounts(data, 'Fiery Dance', 5, [(1, 'Player 1', 2), (2, 'Player 2', 3)])
+
+class BuffTimelinesTest(unittest.TestCase):
+    """ Queries over buff stacks, against the segments they come from. """
+
+    def setUp(self):
+        # might on player 1 from two sources, overlapping between 150 and 200
+        buff_data = pd.DataFrame({'time': [100, 150, 400],
+                                  'duration': [100, 150, 100],
+                                  'buff': ['might', 'might', 'might'],
+                                  'stacks': [2, 1, 3],
+                                  'dst_instid': [1, 1, 1],
+                                  'src_instid': [5, 6, 5]},
+                                 columns=['time', 'duration', 'buff', 'stacks', 'dst_instid', 'src_instid'])
+        self.buffs = BuffTimelines(buff_data)
+
+    def test_timeline_sums_sources_and_drops_to_zero(self):
+        times, counts = self.buffs.timeline(1, 'might')
+        self.assertEqual(times.tolist(), [100, 150, 200, 300, 400, 500])
+        self.assertEqual(counts.tolist(), [2, 3, 1, 0, 3, 0])
+        times, counts = self.buffs.timeline(1, 'might', 6)
+        self.assertEqual(times.tolist(), [150, 300])
+        self.assertEqual(counts.tolist(), [1, 0])
+
+    def test_queries(self):
+        self.assertEqual(self.buffs.stacks_at(1, 'might', 99), 0)
+        self.assertEqual(self.buffs.stacks_at(1, 'might', 150), 3)
+        self.assertEqual(self.buffs.stacks_at(1, 'might', 250), 1)
+        self.assertEqual(self.buffs.max_stacks(1, 'might', 200, 400), 1)
+        self.assertEqual(self.buffs.max_stacks(1, 'might'), 3)
+        self.assertEqual(self.buffs.uptime(1, 'might'), 300)
+        self.assertEqual(self.buffs.uptime(1, 'might', 250, 450), 100)
+        self.assertEqual(self.buffs.uptime(2, 'might'), 0)
+
+    def test_toggled_buff_is_held_between_application_and_removal(self):
+        # a second application while held changes nothing; the last one is
+        # held until the end
+        self.buffs.add_toggled(1001, [1, 1, 1, 1, 2], [100, 150, 300, 700, 200], [True, True, False, True, False], 1000)
+        self.assertEqual(self.buffs.uptime(1, 1001), 500)
+        self.assertEqual(self.buffs.max_stacks(1, 1001), 1)
+        self.assertEqual(self.buffs.uptime(2, 1001), 0)
+
+    def test_stacked_buff_never_drops_below_zero(self):
+        rng = np.random.RandomState(0)
+        for _ in range(200):
+            steps = rng.choice([1, 1, 1, -8], rng.randint(1, 40))
+            buffs = BuffTimelines(self.buffs.buff_data)
+            buffs.add_stacked(1002, np.ones(len(steps), dtype=int), np.arange(len(steps)), steps)
+            stacks = peak = 0
+            for step in steps:
+                stacks = max(stacks + step, 0)
+                peak = max(peak, stacks)
+            self.assertEqual(buffs.max_stacks(1, 1002), peak)
+            self.assertEqual(buffs.stacks_at(1, 1002, len(steps)), stacks)
@@ -0,0 +1,71 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from evtcparser import parser, probe
+from evtcparser.synthetic import write_encounter, DEFAULT_STATE_CHANGE_MIX
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench(filename, args):
+    def parse():
+        with open(filename, 'rb') as file:
+            return parser.Encounter(file, memory_map=args.memory_map, compact=args.compact)
+
+    def probe_file():
+        with open(filename, 'rb') as file:
+            return probe(file, memory_map=args.memory_map)
+
+    for name, function in [('parse', parse), ('probe', probe_file)]:
+        best_time, best_peak = None, None
+        for _ in range(args.repeat):
+            _, elapsed, peak = measure(function)
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+            best_peak = peak if best_peak is None else min(best_peak, peak)
+        print("  {0}: {1:.3f}s, {2:.0f} events/s, peak {3:.1f}MB".format(
+              name, best_time, args.events / best_time, best_peak / 1048576))
+
+def main():
+    argparser = argparse.ArgumentParser(description='Benchmark the EVTC parser on synthetic logs.')
+    argparser.add_argument('-e', '--events', type=int, default=1000000,
+                           help='number of events per log')
+    argparser.add_argument('-a', '--agents', type=int, default=200,
+                           help='number of agents per log')
+    argparser.add_argument('-p', '--players', type=int, default=10,
+                           help='number of player agents per log')
+    argparser.add_argument('-s', '--state-changes', type=float, default=1.0,
+                           help='scale of the default state change mix')
+    argparser.add_argument('-r', '--repeat', type=int, default=3,
+                           help='runs per measurement; the best is reported')
+    argparser.add_argument('--memory-map', action='store_true',
+                           help='parse with memory mapped events')
+    argparser.add_argument('--compact', action='store_true',
+                           help='parse into compact event frames')
+    args = argparser.parse_args()
+
+    state_change_mix = dict((state_change, ratio * args.state_changes)
+                            for state_change, ratio in DEFAULT_STATE_CHANGE_MIX.items())
+
+    for legacy in [False, True]:
+        handle, filename = tempfile.mkstemp(suffix='.evtc')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                write_encounter(file, event_count=args.events, agent_count=args.agents,
+                                player_count=args.players, legacy=legacy,
+                                state_change_mix=state_change_mix)
+            print("{0} events ({1} agents, {2:.1f}MB):".format(
+                  "Legacy" if legacy else "Modern", args.agents, os.path.getsize(filename) / 1048576))
+            bench(filename, args)
+        finally:
+            os.remove(filename)
+
+if __name__ == "__main__":
+    main()
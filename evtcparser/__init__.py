@@ -1 +1,3 @@
-__all__ = ["parser"]
\ No newline at end of file
+from .parser import probe
+
+__all__ = ["parser", "cache", "probe"]
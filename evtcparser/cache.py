@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import numpy as np
+import pandas as pd
+from zipfile import ZipFile, BadZipFile, is_zipfile
+from .parser import Encounter, EvtcParseException, PARSER_VERSION
+
+# Parsed encounters are stored next to the EVTC file as a compressed npz, one
+# array per column. The cache is keyed by the sha1 of the EVTC payload (the
+# single member of a zip archive, not the archive itself), so the key
+# survives the upload being zipped or moved into the encounter archive.
+# Text columns are stored as fixed-width strings, so loading never unpickles
+# anything from beside the uploads.
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.parsed.npz'
+FRAMES = ['events', 'agents', 'skills']
+ATTRIBUTES = ['version', 'area_id', 'revision', 'log_started_at', 'log_ended_at',
+        'compact', 'time_offset', 'compacted_bytes']
+
+def cache_filename(filename):
+    return filename + CACHE_SUFFIX
+
+def checksum(filename):
+    """Returns the sha1 hex digest of the EVTC payload in filename."""
+    if is_zipfile(filename):
+        with ZipFile(filename) as zipfile:
+            contents = zipfile.infolist()
+            if len(contents) != 1:
+                raise EvtcParseException('Only single-file ZIP archives are allowed')
+            try:
+                with zipfile.open(contents[0]) as file:
+                    return _digest(file)
+            except RuntimeError as e:
+                raise EvtcParseException(e)
+
+    with open(filename, 'rb') as file:
+        return _digest(file)
+
+def _digest(file):
+    sha1 = hashlib.sha1()
+    for block in iter(lambda: file.read(1 << 20), b''):
+        sha1.update(block)
+    return sha1.hexdigest()
+
+def save(encounter, filename, key=None):
+    if key is None:
+        key = checksum(filename)
+    arrays = {
+        'meta/parser_version': np.array(PARSER_VERSION),
+        'meta/checksum': np.array(key),
+    }
+    for attribute in ATTRIBUTES:
+        if hasattr(encounter, attribute):
+            arrays['meta/' + attribute] = np.array(getattr(encounter, attribute))
+    for frame_name in FRAMES:
+        frame = getattr(encounter, frame_name)
+        arrays['index/' + frame_name] = frame.index.values
+        if frame.index.name is not None:
+            arrays['index_name/' + frame_name] = np.array(frame.index.name)
+        for column in frame.columns:
+            name = frame_name + '/' + column
+            values = frame[column].values
+            if values.dtype == object:
+                # text, with numbers standing in where there is none (such
+                # as the -1 filled in for the account of non-players); a
+                # frame holding any other objects is left uncached
+                is_text = np.array([isinstance(value, str) for value in values], dtype=bool)
+                arrays[name] = np.array([value if text else '' for value, text in zip(values, is_text)], dtype=str)
+                if not is_text.all():
+                    fill = np.array(values[~is_text].tolist())
+                    if fill.dtype == object:
+                        logger.debug('Not caching %s: column %s holds objects other than text', filename, name)
+                        return
+                    arrays['text/' + name] = is_text
+                    arrays['fill/' + name] = fill
+            else:
+                arrays[name] = values
+
+    # write and rename, so concurrent workers never see a partial cache
+    cache = cache_filename(filename)
+    temp = cache + '.%d.tmp' % os.getpid()
+    with open(temp, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(temp, cache)
+
+def _column(data, name):
+    values = data[name]
+    if values.dtype.kind != 'U':
+        return values
+    values = values.astype(object)
+    if 'text/' + name in data.files:
+        values[np.flatnonzero(~data['text/' + name])] = data['fill/' + name].tolist()
+    return values
+
+def _frame(data, frame_name):
+    prefix = frame_name + '/'
+    columns = [(name[len(prefix):], _column(data, name)) for name in data.files if name.startswith(prefix)]
+    frame = pd.DataFrame(dict(columns), columns=[column for column, _ in columns],
+            index=data['index/' + frame_name])
+    if 'index_name/' + frame_name in data.files:
+        frame.index.name = data['index_name/' + frame_name].item()
+    return frame
+
+def load(filename, key=None, compact=False):
+    """Returns the cached Encounter for filename, or None if there is no valid cache.
+
+    A full cache serves both kinds of load, being compacted when a compact
+    encounter is asked for; a compact cache only serves compact loads.
+    """
+    cache = cache_filename(filename)
+    if not os.path.isfile(cache):
+        return None
+    try:
+        with np.load(cache, allow_pickle=False) as data:
+            if data['meta/parser_version'].item() != PARSER_VERSION:
+                return None
+            if key is None:
+                key = checksum(filename)
+            if data['meta/checksum'].item() != key:
+                return None
+
+            encounter = Encounter.__new__(Encounter)
+            encounter.memory_map = False
+            encounter._event_file = None
+            encounter._event_map = None
+            encounter.compact = False
+            encounter.time_offset = 0
+            for attribute in ATTRIBUTES:
+                if 'meta/' + attribute in data.files:
+                    setattr(encounter, attribute, data['meta/' + attribute].item())
+            if encounter.compact and not compact:
+                return None
+            for frame_name in FRAMES:
+                setattr(encounter, frame_name, _frame(data, frame_name))
+            if compact and not encounter.compact:
+                encounter.compact = True
+                encounter._compact_events()
+            return encounter
+    except (BadZipFile, KeyError, ValueError, OSError):
+        return None
+
+def move(filename, new_filename):
+    try:
+        os.replace(cache_filename(filename), cache_filename(new_filename))
+    except FileNotFoundError:
+        pass
+
+def remove(filename):
+    try:
+        os.remove(cache_filename(filename))
+    except FileNotFoundError:
+        pass
+
+def parse(filename, compact=False):
+    """Parses the encounter in filename, a plain or single-file zipped EVTC file."""
+    if is_zipfile(filename):
+        with ZipFile(filename) as zipfile:
+            contents = zipfile.infolist()
+            if len(contents) != 1:
+                raise EvtcParseException('Only single-file ZIP archives are allowed')
+            try:
+                with zipfile.open(contents[0]) as file:
+                    return Encounter(file, compact=compact)
+            except RuntimeError as e:
+                raise EvtcParseException(e)
+    with open(filename, 'rb') as file:
+        return Encounter(file, memory_map=True, compact=compact)
+
+def load_encounter(filename, compact=False):
+    """Loads the encounter in filename, parsing and caching it unless a valid cache exists."""
+    key = checksum(filename)
+    encounter = load(filename, key, compact)
+    if encounter is not None:
+        return encounter
+
+    encounter = parse(filename, compact)
+    save(encounter, filename, key)
+    return encounter
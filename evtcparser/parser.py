@@ -1,5 +1,6 @@
 import re
 from enum import IntEnum
+import mmap
 import struct
 import numpy as np
 import pandas as pd
@@ -7,6 +8,9 @@ from io import UnsupportedOperation
 
 ENCODING = "utf8"
 
+# bump whenever the parsed frames change, so cached encounters get rebuilt
+PARSER_VERSION = 2
+
 class Activation(IntEnum):
     NONE = 0
     NORMAL = 1
@@ -188,6 +192,52 @@ EVENT_DTYPE = np.dtype([
         ('pad64', np.uint8),
     ], True)
 
+def _lookup(values, keys, mapped, default):
+    # maps values through the sorted keys array, using default where absent
+    result = np.full(len(values), default, dtype=np.int64)
+    if len(keys) == 0:
+        return result
+    positions = np.searchsorted(keys, values)
+    positions[positions == len(keys)] = 0
+    found = keys[positions] == values
+    result[found] = mapped[positions[found]]
+    return result
+
+def _decode_agent_names(names):
+    # player names are "character\0:account\0party"; everything else is a
+    # single NUL-padded name, so only rows with bytes past their first NUL
+    # need splitting, and the rest are decoded once per distinct name
+    raw = np.ascontiguousarray(names).view(np.uint8).reshape(len(names), names.dtype.itemsize)
+    nul = raw == 0
+    first_nul = np.where(nul.any(axis=1), nul.argmax(axis=1), raw.shape[1])
+    after_nul = np.arange(raw.shape[1]) > first_nul[:, np.newaxis]
+    multi = (after_nul & ~nul).any(axis=1)
+
+    decoded = np.empty(len(names), dtype=object)
+    accounts = np.full(len(names), None, dtype=object)
+    parties = np.zeros(len(names), dtype=np.uint8)
+
+    single = ~multi
+    unique_names, inverse = np.unique(names[single], return_inverse=True)
+    decoded[single] = np.array([name.decode(ENCODING) for name in unique_names], dtype=object)[inverse]
+
+    for row in np.flatnonzero(multi):
+        parts = re.split(b'\x00:?', names[row])
+        decoded[row] = parts[0].decode(ENCODING)
+        accounts[row] = parts[1].decode(ENCODING)
+        if len(parts) > 2:
+            parties[row] = int(parts[2])
+    return decoded, accounts, parties
+
+def _convert_legacy_events(events):
+    # lays out legacy events as EVENT_DTYPE in one pass; fields missing from
+    # the legacy format (dst_master_instid, is_offcycle) are left as zero
+    converted = np.zeros(len(events), dtype=EVENT_DTYPE)
+    for name in EVENT_DTYPE.names:
+        if name in EVENT_LEGACY_DTYPE.fields:
+            converted[name] = events[name]
+    return converted
+
 class Encounter:
     def _read_header(self, file):
         if len(file.peek(16)) < 16:
@@ -202,16 +252,10 @@ class Encounter:
         num_agents, = struct.unpack("<i", file.read(4))
         agents_string = file.read(dtype.itemsize * num_agents)
         
-        self.agents = pd.DataFrame(np.fromstring(agents_string, dtype=dtype, count=num_agents))
-        split = self.agents.name.str.split(b'\x00:?', expand=True)
-        if len(split.columns) > 1:
-            self.agents['name'] = split[0].str.decode(ENCODING)
-            self.agents['account'] = split[1].str.decode(ENCODING)
-            self.agents['party'] = split[2].fillna(0).astype(np.uint8)
-        else:
-            self.agents['account'] = None
-            self.agents['party'] = 0
-            
+        agents = np.fromstring(agents_string, dtype=dtype, count=num_agents)
+        self.agents = pd.DataFrame(agents)
+        self.agents['name'], self.agents['account'], self.agents['party'] = _decode_agent_names(agents['name'])
+
         self.agents[['prof']] = self.agents[['prof']].astype(np.uint32)
 
     def _read_skills(self, file):
@@ -220,17 +264,48 @@ class Encounter:
         self.skills = pd.DataFrame(np.fromstring(skills_string, dtype=SKILL_DTYPE, count=num_skills)).set_index('id')
         self.skills['name'] = self.skills['name'].str.decode(ENCODING)
     
+    def _map_events(self, file, dtype):
+        # only real files can be mapped; zip members and other streams fall
+        # back to reading. The map is held until close(), as the returned
+        # array is a view into it
+        try:
+            fileno = file.fileno()
+        except (AttributeError, UnsupportedOperation):
+            return None
+        offset = file.tell()
+        self._event_map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(self._event_map, dtype=dtype, offset=offset)
+
+    def close(self):
+        """Releases the memory map the events were read through, if any.
+
+        Chunks from iter_event_chunks are views into the map, and must not
+        be held past this.
+        """
+        if self._event_map is not None:
+            self._event_map.close()
+            self._event_map = None
+
+    def _event_dtype(self):
+        if self.version < "20181002" and self.revision == 0:
+            return EVENT_LEGACY_DTYPE
+        return EVENT_DTYPE
+
+    def _event_array(self, file):
+        dtype = self._event_dtype()
+        events = self._map_events(file, dtype) if self.memory_map else None
+        if events is None:
+            events = np.frombuffer(file.read(), dtype=dtype)
+        if dtype is EVENT_LEGACY_DTYPE:
+            events = _convert_legacy_events(events)
+        return events
+
     def _read_events(self, file):
-        events_string = file.read()
-        if(self.version < "20181002" and self.revision == 0):
-            self.events = pd.DataFrame(np.fromstring(events_string, dtype=EVENT_LEGACY_DTYPE))
-            for name in ['iss_offset','iss_offset_target','iss_bd_offset',
-                    'iss_bd_offset_target','iss_alt_offset','iss_alt_offset_target',
-                    'result_local','ident_local']:
-                del self.events[name]
-                self.events['dst_master_instid'] = 0
-        else:
-            self.events = pd.DataFrame(np.fromstring(events_string, dtype=EVENT_DTYPE))
+        # the frame copies every field out of the event table into its own
+        # columns, so mapping the file only saves reading the table into
+        # memory first; the map is released as soon as the frame is built
+        self.events = pd.DataFrame(self._event_array(file))
+        self.close()
 
         if len(self.events[self.events.state_change == StateChange.LOG_END]) == 0:
             pass
@@ -244,6 +319,33 @@ class Encounter:
         else:
             self.log_started_at = log_start_events.iloc[0]
 
+    def iter_event_chunks(self, chunk_size=65536):
+        """Yields the events of a streamed encounter as EVENT_DTYPE arrays of at most chunk_size records."""
+        if self._event_file is None:
+            raise EvtcParseException('Events are only streamed from encounters opened with stream_events')
+        file, self._event_file = self._event_file, None
+        dtype = self._event_dtype()
+
+        try:
+            events = self._map_events(file, dtype) if self.memory_map else None
+        except ValueError:
+            raise EvtcParseException('Bad or truncated EVTC file')
+        if events is not None:
+            for start in range(0, len(events), chunk_size):
+                chunk = events[start:start + chunk_size]
+                yield _convert_legacy_events(chunk) if dtype is EVENT_LEGACY_DTYPE else chunk
+            return
+
+        chunk_bytes = chunk_size * dtype.itemsize
+        while True:
+            chunk = file.read(chunk_bytes)
+            if not chunk:
+                return
+            if len(chunk) % dtype.itemsize != 0:
+                raise EvtcParseException('Bad or truncated EVTC file')
+            chunk = np.frombuffer(chunk, dtype=dtype)
+            yield _convert_legacy_events(chunk) if dtype is EVENT_LEGACY_DTYPE else chunk
+
     def _old_add_inst_id_to_agents(self):
         
         self.raw_agents = self.agents
@@ -253,39 +355,72 @@ class Encounter:
         agent_map = agent_map[agent_map.inst_id != 0].drop_duplicates().set_index('addr')
         self.agents = self.agents.set_index('addr').join(agent_map).groupby('inst_id').first()
         
-    def _add_inst_id_to_agents(self):   
+    def _add_inst_id_to_agents(self):
         #ignore higher order state change events because they can have junk values
-        agent_events = self.events[self.events.state_change <= 8]
+        agent_events = self.events.state_change.values <= 8
+        times = self.events.time.values[agent_events]
+        addrs = np.concatenate([self.events.src_agent.values[agent_events], self.events.dst_agent.values[agent_events]])
+        inst_ids = np.concatenate([self.events.src_instid.values[agent_events], self.events.dst_instid.values[agent_events]])
+        times = np.concatenate([times, times])
 
-        src_agent_map = agent_events[['time', 'src_agent', 'src_instid']].rename(columns={ 'src_agent': 'addr', 'src_instid': 'inst_id'})
-        dst_agent_map = agent_events[['time', 'dst_agent', 'dst_instid']].rename(columns={ 'dst_agent': 'addr', 'dst_instid': 'inst_id'})
+        # the first appearance of each address, in time order, gets the next new id
+        present = inst_ids != 0
+        order = np.argsort(times[present])
+        addrs = addrs[present][order]
+        inst_ids = inst_ids[present][order]
+        first_seen = ~pd.Series(addrs).duplicated().values
+        map_addrs = addrs[first_seen]
+        map_inst_ids = inst_ids[first_seen]
+        new_ids = np.arange(1, 1 + len(map_addrs))
+
+        addr_order = np.argsort(map_addrs)
+        addr_keys, addr_ids = map_addrs[addr_order], new_ids[addr_order]
+        # a reused old inst_id maps to the new id of its earliest address
+        inst_id_keys, inst_id_first = np.unique(map_inst_ids, return_index=True)
+        inst_id_ids = new_ids[inst_id_first]
+
+        self.events['src_instid'] = _lookup(self.events.src_agent.values, addr_keys, addr_ids, 0)
+        self.events['dst_instid'] = _lookup(self.events.dst_agent.values, addr_keys, addr_ids, 0)
+        self.events['src_master_instid'] = _lookup(self.events.src_master_instid.values, inst_id_keys, inst_id_ids, 0)
 
-        agent_map = pd.concat([src_agent_map, dst_agent_map])
-        agent_map = agent_map[agent_map.inst_id != 0]
-        agent_map = agent_map.sort_values(by='time')
-        agent_map.drop_duplicates(subset='addr',inplace=True)
-        agent_map.insert(0, 'new_id', range(1, 1 + len(agent_map)))
-
-        del self.events['src_instid']
-        del self.events['dst_instid']
-        self.events = pd.merge(left=self.events,right=agent_map[['addr', 'new_id']].rename(columns={'addr' : 'src_agent', 'new_id' : 'src_instid'}), how='left', left_on='src_agent', right_on='src_agent')
-        self.events = pd.merge(left=self.events,right=agent_map[['addr', 'new_id']].rename(columns={'addr' : 'dst_agent', 'new_id' : 'dst_instid'}), how='left')
-        instid_map = agent_map.drop_duplicates(subset='inst_id',inplace=False)
-        self.events = self.events.rename(columns={'src_master_instid' : 'old_src_master_instid'})
-        self.events = pd.merge(left=self.events,right=instid_map[['inst_id', 'new_id']].rename(columns={'inst_id' : 'old_src_master_instid', 'new_id' : 'src_master_instid'}), how='left') 
-        self.events.fillna(0, inplace=True)
-        self.events[['src_instid', 'dst_instid','src_master_instid']] = self.events[['src_instid', 'dst_instid','src_master_instid']].astype(np.int64)
-        
-        #self.addr_agents = self.agents.set_index('addr')
         # deal with duplicate inst_id for different addrs
-        self.agents = pd.merge(left=self.agents,right=agent_map[['addr', 'new_id']].rename(columns={'new_id' : 'inst_id'}), how='left')
+        self.agents['inst_id'] = _lookup(self.agents.addr.values, addr_keys, addr_ids, -1)
         self.agents.fillna(-1, inplace=True)
-        self.agents[['inst_id']] = self.agents[['inst_id']].astype(np.int64)
         self.agents = self.agents.set_index('inst_id')
-        del self.events['old_src_master_instid']
         del self.agents['addr']
 
-    def __init__(self, file):
+    def _compact_events(self):
+        # drops padding, rebases time to milliseconds from log start (kept in
+        # time_offset) and narrows instance ids; src_agent and dst_agent stay
+        # int64 since state change events store 64-bit values in them
+        events = self.events
+        before = events.memory_usage(index=True).sum()
+        for name in ['pad61', 'pad62', 'pad63', 'pad64']:
+            if name in events:
+                del events[name]
+
+        times = events.time.values
+        log_start = times[events.state_change.values == StateChange.LOG_START]
+        self.time_offset = int(log_start[0]) if len(log_start) else 0
+        events['time'] = (times.astype(np.int64) - self.time_offset).astype(np.int32)
+
+        inst_id_columns = ['src_instid', 'dst_instid', 'src_master_instid']
+        max_inst_id = max(int(events[name].max()) for name in inst_id_columns) if len(events) else 0
+        inst_id_dtype = np.int16 if max_inst_id <= np.iinfo(np.int16).max else np.int32
+        for name in inst_id_columns:
+            events[name] = events[name].values.astype(inst_id_dtype)
+
+        self.compacted_bytes = before - events.memory_usage(index=True).sum()
+
+    def __init__(self, file, memory_map=False, stream_events=False, compact=False):
+        # with stream_events, only the header, agents and skills are parsed;
+        # events are left in the file for iter_event_chunks, and agents keep
+        # their addr column since instance ids are never remapped
+        self.memory_map = memory_map
+        self.compact = compact
+        self.time_offset = 0
+        self._event_file = None
+        self._event_map = None
         try:
             self._read_header(file)
 
@@ -293,9 +428,51 @@ class Encounter:
                 raise EvtcParseException('Unsupported EVTC version')
             self._read_agents(file)
             self._read_skills(file)
+            if stream_events:
+                self._event_file = file
+                return
             self._read_events(file)
             self._add_inst_id_to_agents()
+            if compact:
+                self._compact_events()
         except UnsupportedOperation:
             raise EvtcParseException('Bad EVTC file')
         except ValueError:
             raise EvtcParseException('Bad or truncated EVTC file')
+
+class EncounterProbe:
+    def __init__(self, encounter, state_events):
+        self.version = encounter.version
+        self.area_id = encounter.area_id
+        self.revision = encounter.revision
+
+        agents = encounter.agents
+        players = agents[(agents.prof >= AgentType.GUARDIAN) & (agents.prof <= AgentType.REVENANT)]
+        self.accounts = [account for account in players.account if isinstance(account, str)]
+
+        state_changes = state_events['state_change']
+        log_start = state_events[state_changes == StateChange.LOG_START]
+        if len(log_start) == 0:
+            raise EvtcParseException('EVTC missing start event')
+        self.log_started_at = int(log_start['value'][0])
+        self.log_start_time = int(log_start['time'][0])
+
+        gw_build = state_events[state_changes == StateChange.GW_BUILD]
+        self.gw_build = int(gw_build['src_agent'][0]) if len(gw_build) else 0
+
+        reward = state_events[state_changes == StateChange.REWARD]
+        self.reward_id = int(reward['value'][-1]) if len(reward) else None
+        self.reward_time = int(reward['time'][-1]) if len(reward) else None
+
+def probe(file, memory_map=False):
+    # reads the header, agents and skills, and only the state change events
+    # out of the event table, without building any frames for it
+    encounter = Encounter(file, memory_map=memory_map, stream_events=True)
+    state_events = [chunk[chunk['state_change'] != StateChange.NORMAL]
+            for chunk in encounter.iter_event_chunks()]
+    encounter.close()
+    if state_events:
+        state_events = np.concatenate(state_events)
+    else:
+        state_events = np.zeros(0, dtype=EVENT_DTYPE)
+    return EncounterProbe(encounter, state_events)
@@ -0,0 +1,99 @@
+import struct
+import numpy as np
+from .parser import (StateChange, AGENT_20180724_DTYPE, SKILL_DTYPE,
+        EVENT_DTYPE, EVENT_LEGACY_DTYPE)
+
+# Writes random but structurally valid EVTC files, for benchmarking the parser
+# without real player logs. Nothing here resembles a real fight, so the
+# output is not meant to be analysed.
+
+MODERN_VERSION = "20190801"
+LEGACY_VERSION = "20180801"
+
+# fraction of events with each state change; the rest are combat events
+DEFAULT_STATE_CHANGE_MIX = {
+    StateChange.HEALTH_UPDATE: 0.01,
+    StateChange.ENTER_COMBAT: 0.0005,
+    StateChange.EXIT_COMBAT: 0.0005,
+    StateChange.CHANGE_UP: 0.0005,
+    StateChange.CHANGE_DOWN: 0.0005,
+    StateChange.CHANGE_DEAD: 0.0002,
+    StateChange.WEAPON_SWAP: 0.002,
+    StateChange.MAX_HEALTH_UPDATE: 0.0005,
+}
+
+def _agents(rng, agent_count, player_count):
+    agents = np.zeros(agent_count, dtype=AGENT_20180724_DTYPE)
+    agents['addr'] = rng.permutation(agent_count) * 16 + 0x10000
+    players = np.arange(agent_count) < player_count
+    agents['prof'] = np.where(players, 1 + np.arange(agent_count) % 9, 0xFFFF0000 | (5000 + np.arange(agent_count) % 200))
+    agents['elite'] = np.where(players, 0, -1)
+    agents['toughness'] = np.where(players, 10, 0)
+    agents['name'] = [
+        ("Player %d\0:Account.%04d\0%d" % (i, i, 1 + i // 5) if i < player_count else "Enemy %d" % (i % 200)).encode()
+        for i in range(agent_count)]
+    return agents
+
+def _skills(skill_count):
+    skills = np.zeros(skill_count, dtype=SKILL_DTYPE)
+    skills['id'] = 1000 + np.arange(skill_count)
+    skills['name'] = [("Skill %d" % i).encode() for i in range(skill_count)]
+    return skills
+
+def _events(rng, agents, skills, event_count, state_change_mix, legacy):
+    events = np.zeros(event_count, dtype=EVENT_LEGACY_DTYPE if legacy else EVENT_DTYPE)
+    events['time'] = 1000000 + np.sort(rng.randint(0, max(event_count, 1) * 30, event_count))
+
+    inst_ids = np.arange(len(agents)) + 1
+    src = rng.randint(0, len(agents), event_count)
+    dst = rng.randint(0, len(agents), event_count)
+    events['src_agent'] = agents['addr'][src]
+    events['dst_agent'] = agents['addr'][dst]
+    events['src_instid'] = inst_ids[src]
+    events['dst_instid'] = inst_ids[dst]
+    events['skillid'] = skills['id'][rng.randint(0, len(skills), event_count)]
+    events['value'] = rng.randint(0, 10000, event_count)
+    events['iff'] = rng.randint(0, 2, event_count)
+    events['result'] = rng.randint(0, 3, event_count)
+    events['is_flanking'] = rng.randint(0, 2, event_count)
+
+    buffs = rng.rand(event_count) < 0.3
+    events['buff'] = buffs
+    events['buff_dmg'] = np.where(buffs & (rng.rand(event_count) < 0.3), rng.randint(0, 500, event_count), 0)
+    events['is_buffremove'] = buffs * (rng.rand(event_count) < 0.1)
+    events['is_activation'] = (rng.rand(event_count) < 0.05) * rng.randint(1, 5, event_count)
+
+    thresholds = np.cumsum(list(state_change_mix.values()))
+    picks = np.searchsorted(thresholds, rng.rand(event_count), side='right')
+    state_changes = np.array(list(state_change_mix.keys()) + [StateChange.NORMAL])
+    events['state_change'] = state_changes[picks]
+
+    if event_count >= 2:
+        events[0] = 0
+        events['time'][0] = events['time'][1]
+        events['state_change'][0] = StateChange.LOG_START
+        events['value'][0] = 1565000000
+        events[-1] = 0
+        events['time'][-1] = events['time'][-2]
+        events['state_change'][-1] = StateChange.LOG_END
+        events['value'][-1] = 1565000000 + int(events['time'][-1] - events['time'][0]) // 1000
+    return events
+
+def write_encounter(file, event_count=100000, agent_count=100, player_count=10,
+        skill_count=200, area_id=0x3C4E, legacy=False, state_change_mix=None, seed=0):
+    rng = np.random.RandomState(seed)
+    if state_change_mix is None:
+        state_change_mix = DEFAULT_STATE_CHANGE_MIX
+    player_count = min(player_count, agent_count)
+    version = LEGACY_VERSION if legacy else MODERN_VERSION
+
+    agents = _agents(rng, agent_count, player_count)
+    skills = _skills(skill_count)
+    events = _events(rng, agents, skills, event_count, state_change_mix, legacy)
+
+    file.write(struct.pack("<4s9sHB", b"EVTC", version.encode(), area_id, 0))
+    file.write(struct.pack("<i", len(agents)))
+    file.write(agents.tobytes())
+    file.write(struct.pack("<i", len(skills)))
+    file.write(skills.tobytes())
+    file.write(events.tobytes())
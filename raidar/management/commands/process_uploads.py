@@ -6,13 +6,15 @@ from contextlib import contextmanager
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.db.utils import IntegrityError
-from evtcparser.parser import Encounter as EvtcEncounter, EvtcParseException
+from evtcparser.parser import EvtcParseException
+from evtcparser import cache as parsed_cache
 from gw2raidar import settings
 from raidar.models import *
 from sys import exit, stderr
 from time import time
-from zipfile import ZipFile, BadZipFile, ZIP_DEFLATED
+from zipfile import ZipFile, BadZipFile, ZIP_DEFLATED, is_zipfile
 from queue import Empty
+from json import dumps as json_dumps
 import os
 import os.path
 import logging
@@ -128,6 +130,11 @@ class Command(BaseCommand):
             type=int,
             dest='limit',
             help='Limit of uploads to process')
+        parser.add_argument('--profile',
+            nargs='?',
+            const=True,
+            dest='profile',
+            help='Log the time and memory of each analysis stage, and append them as JSON lines to the given file')
 
     def handle(self, *args, **options):
         with single_process('process_uploads'):
@@ -141,6 +148,7 @@ class Command(BaseCommand):
                 print("Completed in %ss" % (end - start))
 
     def analyse_uploads(self, *args, **options):
+        self.profile = options.get('profile')
         new_uploads = Upload.objects.order_by('-filename')
         if 'limit' in options:
             new_uploads = new_uploads[:options['limit']]
@@ -182,26 +190,27 @@ class Command(BaseCommand):
 
     def analyse_upload(self, upload):
         diskname = upload.diskname()
-        zipfile = None
-        file = None
+        zipped = upload.filename.endswith('.evtc.zip') or upload.filename.endswith('.zevtc')
 
         try:
-            if upload.filename.endswith('.evtc.zip') or upload.filename.endswith('.zevtc'):
-                zipfile = ZipFile(diskname)
-                contents = zipfile.infolist()
-                if len(contents) == 1:
-                    try:
-                        file = zipfile.open(contents[0].filename)
-                    except RuntimeError as e:
-                        raise EvtcAnalysisException(e)
-                else:
-                    raise EvtcParseException('Only single-file ZIP archives are allowed')
+            if zipped and not is_zipfile(diskname):
+                raise BadZipFile('File is not a zip file')
+            if not zipped and is_zipfile(diskname):
+                raise EvtcParseException('Not an EVTC file')
+
+            compact = not hasattr(settings, 'COMPACT_PARSED_EVENTS') or settings.COMPACT_PARSED_EVENTS
+            if hasattr(settings, 'CACHE_PARSED_ENCOUNTERS') and settings.CACHE_PARSED_ENCOUNTERS:
+                # a reupload finds the cache of its earlier attempt; a new
+                # one is saved before analysis, which adds columns to the frames
+                evtc_encounter = parsed_cache.load_encounter(diskname, compact=compact)
             else:
-                file = open(diskname, 'rb')
-
-            evtc_encounter = EvtcEncounter(file)
+                evtc_encounter = parsed_cache.parse(diskname, compact=compact)
+            if compact:
+                logger.debug("compacted events by %.1fMB", evtc_encounter.compacted_bytes / 1048576)
 
-            analyser = Analyser(evtc_encounter)
+            analyser = Analyser(evtc_encounter, profile=bool(self.profile))
+            if self.profile:
+                self.save_profile(upload, analyser)
 
             dump = analyser.data
             uploader = upload.uploaded_by
@@ -244,7 +253,7 @@ class Command(BaseCommand):
                 filename = upload.filename
                 orig_filename = filename
                 encounter_data = EncounterData.from_dump(dump)
-                if not zipfile:
+                if not zipped:
                     filename += ".zip"
                 try:
                     encounter = Encounter.objects.get(
@@ -258,6 +267,7 @@ class Command(BaseCommand):
                                 os.remove(old_filename)
                             except FileNotFoundError:
                                 pass
+                            parsed_cache.remove(old_filename)
                     encounter.era = era
                     encounter.filename = filename
                     encounter.uploaded_on = datetime.fromtimestamp(upload.uploaded_at, timezone.utc)
@@ -285,17 +295,15 @@ class Command(BaseCommand):
                     encounter.tagstring = upload_val['tagstring']
                 encounter.save()
 
-                file.close()
-                file = None
                 new_diskname = encounter.diskname()
                 os.makedirs(os.path.dirname(new_diskname), exist_ok=True)
-                if zipfile:
-                    zipfile.close()
-                    zipfile = None
+                if zipped:
                     os.rename(diskname, new_diskname)
                 else:
                     with ZipFile(new_diskname, 'w', ZIP_DEFLATED) as zipfile_out:
                         zipfile_out.write(diskname, orig_filename)
+                # the cache is keyed by the EVTC payload, so it stays valid once zipped
+                parsed_cache.move(diskname, new_diskname)
 
                 for name, player in status_for.items():
                     account, _ = Account.objects.get_or_create(
@@ -375,6 +383,8 @@ class Command(BaseCommand):
             os.makedirs(path, exist_ok=True)
             path = os.path.join(path, os.path.basename(diskname))
             os.rename(diskname, path)
+            # kept with the stored file, so a reupload of it skips parsing
+            parsed_cache.move(diskname, path)
             with open(path + '.error', 'w') as f:
                 f.write("%s (%s)\n" % (upload.filename, upload.uploaded_by.username))
                 f.write(exc)
@@ -386,14 +396,19 @@ class Command(BaseCommand):
             })
 
         finally:
-            if file:
-                file.close()
-
-            if zipfile:
-                zipfile.close()
-
+            parsed_cache.remove(diskname)
             upload.delete()
 
+    def save_profile(self, upload, analyser):
+        logger.info("analysis stages of %s (%s):\n%s", upload.filename, analyser.boss_info.name, analyser.profiler.report())
+        if self.profile is not True:
+            with open(self.profile, 'a') as f:
+                f.write(json_dumps({
+                    'upload': upload.filename,
+                    'boss': analyser.boss_info.name,
+                    'stages': analyser.stages,
+                }) + "\n")
+
     def clean_up(self, *args, **options):
         # delete Notifications older than 45s (assuming poll is every 30s)
         Notification.objects.filter(created_at__lt=time() - 45).delete()
@@ -18,6 +18,7 @@ from pandas import DataFrame
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 from django.db.utils import IntegrityError
+from evtcparser import cache as parsed_cache
 from raidar.models import Variable, Encounter, RestatPerfStats, Era, settings, datetime, Area, EncounterDamage, \
     EncounterBuff, EncounterPlayer, EncounterEvent, BuildStat, EncounterPhase, SquadStat, UserStat
 
@@ -73,6 +74,7 @@ def delete_old_files():
                 num_pruned += 1
             except FileNotFoundError:
                 pass
+            parsed_cache.remove(filename)
         encounter.has_evtc = False
         encounter.save()
 
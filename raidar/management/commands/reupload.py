@@ -8,6 +8,7 @@ from django.core.management.base import BaseCommand, CommandError
 #from evtcparser.parser import Encounter as EvtcEncounter, EvtcParseException
 #from gw2raidar import settings
 #from json import loads as json_loads, dumps as json_dumps
+from evtcparser import cache as parsed_cache
 from raidar.models import *
 #from sys import exit, stderr
 from time import time
@@ -62,4 +63,5 @@ class Command(BaseCommand):
             diskname = upload.diskname()
             os.makedirs(os.path.dirname(diskname), exist_ok=True)
             os.rename(filename, diskname)
+            parsed_cache.move(filename, diskname)
             os.remove(filename + '.error')
@@ -56,8 +56,7 @@ class ReplayWriter:
                                                   self.damage_events['value'],
                                                   self.damage_events['buff_dmg']))
         self.damage_events = self.damage_events[self.damage_events.damage > 0]
-        self.buff_data = analyser.buff_data.copy()
-        self.buff_data['time'] = self.buff_data['time'].apply(lambda x : (x - self.start_time) / 1000.0)
+        self.buff_timelines = analyser.buff_timelines
         
     
     def writePlayerData(self, agentId, dataOut):
@@ -110,23 +109,17 @@ class ReplayWriter:
     def writeBuffTracks(self, agentId, dataOut):
         dataOut["base-state"][str(agentId)]["buff"] = {}
         for buffType in ana.buffs.BUFF_TYPES:
-            buffData = self.buff_data[(self.buff_data.dst_instid == agentId)&(self.buff_data.buff == buffType.code)]
-            if len(buffData) > 0:
+            times, stacks = self.buff_timelines.timeline(agentId, buffType.code)
+            if len(times) > 0:
                 dataOut["base-state"][str(agentId)]["buff"][buffType.code] = 0
                 track = {"path" : [str(agentId), "buff", buffType.code], "data-type" : "numeric", "update-type" : "delta", "interpolation" : "floor"}
                 track["data"] = []
                 dataOut["tracks"] += [track]
-                
-                lastTotal = 0
-                srcStacks = {}
-                for event in buffData[['time', 'stacks', 'src_instid']].itertuples():
-                    srcStacks[event[3]] = int(event[2])
-                    
-                    total = sum(srcStacks.values())
-                    if total != lastTotal:
-                        lastTotal = total
-                        track["data"] += [{'time' : event[1], 'value' : total}]                    
-                        
+
+                times = (times - self.start_time) / 1000.0
+                for time, total in zip(times.tolist(), stacks.tolist()):
+                    track["data"] += [{'time' : time, 'value' : total}]
+
     def writeHealthUpdates(self, agentId, dataOut):
         agent = self.agents.loc[agentId]
         
@@ -9,6 +9,7 @@ from enum import IntEnum
 import json
 from zipfile import ZipFile
 import argparse
+import logging
 
 def is_basic_value(node):
     try:
@@ -58,12 +59,29 @@ def main():
                             help='silent mode, no output dump')
     argparser.add_argument('--no-json', dest='json', action='store_false',
                             help='disable json output')
+    argparser.add_argument('-c', '--cache', dest='cache', action='store_true',
+                            help='reuse or create a parsed cache next to each file')
+    argparser.add_argument('-p', '--profile', dest='profile', action='store_true',
+                            help='print the time and memory of each analysis stage')
+
+    argparser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                            help='log phase and success detection details')
 
     args = argparser.parse_args()
+    logging.basicConfig(format='%(message)s', level=logging.DEBUG if args.verbose else logging.WARNING)
     start_all = time.clock()
     print("Parsing {0}".format(args.filenames))
     for filename in args.filenames:
         print("Loading {0}".format(filename))
+        if args.cache:
+            start = time.clock()
+            # compact, like the encounters cached by the upload processor
+            e = cache.load_encounter(filename, compact=True)
+            print("Loading took {0} seconds".format(time.clock() - start))
+            print("Evtc version {0}".format(e.version))
+            analyse(e, filename, args)
+            continue
+
         with open(filename, mode='rb') as file:
 
             if filename.endswith('.evtc.zip') or filename.endswith('.zevtc'):
@@ -76,31 +94,36 @@ def main():
                     sys.exit(1)
 
             start = time.clock()
-            e = parser.Encounter(file)
+            e = parser.Encounter(file, memory_map=True)
             print("Parsing took {0} seconds".format(time.clock() - start))
             print("Evtc version {0}".format(e.version))
 
-            start = time.clock()
-            a = analyser.Analyser(e)
-            print("Analyser took {0} seconds".format(time.clock() - start))
-
-            start = time.clock()
-            with open('Output/'+os.path.basename(filename)+'.txt','w',encoding='utf-8') as output_file:
-                flattened = flatten(a.data)
-                for key in sorted(flattened.keys()):
-                    if not args.silent:
-                        print_node(key, flattened[key])
-                    print_node(key, flattened[key], output_file)
-            print("Completed parsing {0} - Success: {1}".format(
-                  list(a.data['Category']['boss']['Boss'].keys())[0],
-                  a.data['Category']['encounter']['success']))
-            print("Readable dump took {0} seconds".format(time.clock() - start))
-
-            if "--no-json" not in sys.argv:
-                start = time.clock()
-                print(json.dumps(a.data), file=open('output.json','w'))
-                print("JSon dump took {0} seconds".format(time.clock() - start))
+            analyse(e, filename, args)
     print("Analysing all took {0} seconds".format(time.clock() - start_all))
 
+def analyse(e, filename, args):
+    start = time.clock()
+    a = analyser.Analyser(e, profile=args.profile)
+    print("Analyser took {0} seconds".format(time.clock() - start))
+    if args.profile:
+        print(a.profiler.report())
+
+    start = time.clock()
+    with open('Output/'+os.path.basename(filename)+'.txt','w',encoding='utf-8') as output_file:
+        flattened = flatten(a.data)
+        for key in sorted(flattened.keys()):
+            if not args.silent:
+                print_node(key, flattened[key])
+            print_node(key, flattened[key], output_file)
+    print("Completed parsing {0} - Success: {1}".format(
+          list(a.data['Category']['boss']['Boss'].keys())[0],
+          a.data['Category']['encounter']['success']))
+    print("Readable dump took {0} seconds".format(time.clock() - start))
+
+    if "--no-json" not in sys.argv:
+        start = time.clock()
+        print(json.dumps(a.data), file=open('output.json','w'))
+        print("JSon dump took {0} seconds".format(time.clock() - start))
+
 if __name__ == "__main__":
     main()